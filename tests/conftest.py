@@ -0,0 +1,15 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+
+@pytest.fixture
+def data_path(tmp_path, monkeypatch):
+    """Point Red's data paths at a temporary folder."""
+    import vexutils.shared
+
+    monkeypatch.setattr(vexutils.shared, "cog_data_path", lambda *a, **k: tmp_path)
+    return tmp_path
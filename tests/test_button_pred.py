@@ -0,0 +1,152 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from discord import ButtonStyle, InteractionType
+
+from vexutils import button_pred
+from vexutils.button_pred import PredItem, dispatcher_stats, wait_for_press
+
+ITEMS = [PredItem("yes", ButtonStyle.green, "Yes"), PredItem("no", ButtonStyle.red, "No")]
+
+
+class Bot:
+    def __init__(self) -> None:
+        self.listeners: list = []
+
+    def add_listener(self, func, name):
+        self.listeners.append((func, name))
+
+    def remove_listener(self, func, name):
+        self.listeners.remove((func, name))
+
+
+class Response:
+    def __init__(self) -> None:
+        self.sent: list = []
+
+    async def send_message(self, content, ephemeral=False):
+        self.sent.append(content)
+
+    async def edit_message(self, view=None):
+        self.sent.append(view)
+
+    async def defer(self):
+        self.sent.append(None)
+
+
+class Context:
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+        self.author = SimpleNamespace(id=1)
+        self.messages: list = []
+
+    async def send(self, content=None, embed=None, view=None):
+        self.messages.append(view)
+
+
+def _press(message_view, index: int, user_id: int = 1) -> SimpleNamespace:
+    return SimpleNamespace(
+        type=InteractionType.component,
+        data={"custom_id": message_view.children[index].custom_id},
+        user=SimpleNamespace(id=user_id),
+        response=Response(),
+    )
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    yield
+    state = button_pred._state
+    if state["timer"] is not None:
+        state["timer"].cancel()
+    state.update(bot=None, listener=None, prompts={}, heap=[], timer=None)
+
+
+def test_press_and_expiry():
+    bot = Bot()
+    ctx = Context(bot)
+
+    async def run():
+        prompt = asyncio.ensure_future(wait_for_press(ctx, ITEMS, timeout=5, dispatcher=True))
+        await asyncio.sleep(0)
+        listener = bot.listeners[0][0]
+
+        other_user = _press(ctx.messages[0], 1, user_id=2)
+        await listener(other_user)
+        assert not prompt.done()
+        await listener(_press(ctx.messages[0], 1))
+        assert await prompt == "no"
+
+        with pytest.raises(asyncio.TimeoutError):
+            await wait_for_press(ctx, ITEMS, timeout=0.05, dispatcher=True)
+
+        stale = _press(ctx.messages[1], 0)
+        await listener(stale)
+        assert stale.response.sent == ["This has expired."]
+
+    asyncio.run(run())
+
+    stats = dispatcher_stats()
+    assert stats["open"] == 0
+    assert stats["pressed"] >= 2 and stats["expired"] >= 1 and stats["stale"] >= 1
+
+
+def test_listener_from_another_copy_is_replaced():
+    async def old_listener(interaction):
+        pass
+
+    bot = Bot()
+    bot.add_listener(old_listener, "on_interaction")
+    button_pred._state.update(bot=bot, listener=old_listener)
+    ctx = Context(bot)
+
+    async def run():
+        prompt = asyncio.ensure_future(wait_for_press(ctx, ITEMS, timeout=5, dispatcher=True))
+        await asyncio.sleep(0)
+        assert bot.listeners == [(button_pred._on_interaction, "on_interaction")]
+        # other copies only see plain data, and the callbacks of the prompts they opened
+        record = next(iter(button_pred._state["prompts"].values()))
+        assert type(record) is dict
+        await bot.listeners[0][0](_press(ctx.messages[0], 0))
+        return await prompt
+
+    assert asyncio.run(run()) == "yes"
+
+
+def test_final_edit_waits_for_tally_edit():
+    class Message:
+        def __init__(self) -> None:
+            self.edits: list = []
+
+        async def edit(self, view=None):
+            self.edits.append(("start", view))
+            await asyncio.sleep(0.1)  # still in flight when the prompt expires
+            self.edits.append(("end", view))
+
+    class TallyContext(Context):
+        async def send(self, content=None, embed=None, view=None):
+            self.messages.append(view)
+            return message
+
+    message = Message()
+    bot = Bot()
+    ctx = TallyContext(bot)
+
+    async def run():
+        prompt = asyncio.ensure_future(
+            button_pred.collect_presses(ctx, ITEMS, timeout=0.1, tally_interval=0.05)
+        )
+        await asyncio.sleep(0)
+        listener = bot.listeners[0][0]
+        await listener(_press(ctx.messages[0], 0, user_id=1))  # edits the tally straight away
+        await listener(_press(ctx.messages[0], 1, user_id=2))  # waits for the interval
+        return await prompt
+
+    result = asyncio.run(run())
+
+    assert result.counts == [1, 1]
+    assert [step for step, _ in message.edits] == ["start", "end", "start", "end"]
+    live, final = message.edits[0][1], message.edits[2][1]
+    assert live.children[0].custom_id is not None
+    assert all(button.disabled for button in final.children)
@@ -0,0 +1,51 @@
+from rich import box
+from rich.table import Table
+from rich.text import Text
+
+from vexutils import chat
+from vexutils.chat import no_colour_rich_markup
+
+
+def _table(**kwargs) -> Table:
+    table = Table("Key", "Value", title="Test", box=box.MINIMAL, **kwargs)
+    table.add_row("a", "1")
+    table.add_row("b", "2")
+    return table
+
+
+def test_cache_hit_for_same_table():
+    chat._render_cache.clear()
+    first = no_colour_rich_markup(_table(), cache=True)
+    assert no_colour_rich_markup(_table(), cache=True) == first
+    assert len(chat._render_cache) == 1
+
+
+def test_layout_options_are_in_the_key():
+    chat._render_cache.clear()
+    no_colour_rich_markup(_table(), cache=True)
+
+    wide = _table(padding=(0, 5))
+    assert no_colour_rich_markup(wide, cache=True) == no_colour_rich_markup(wide)
+
+    other = _table(show_edge=False)
+    other.columns[1].footer = "Total"
+    other.show_footer = True
+    assert no_colour_rich_markup(other, cache=True) == no_colour_rich_markup(other)
+
+    ratio = _table(expand=True)
+    ratio.columns[0].ratio = 3
+    assert no_colour_rich_markup(ratio, cache=True) == no_colour_rich_markup(ratio)
+
+    sections = _table()
+    sections.rows[0].end_section = True
+    assert no_colour_rich_markup(sections, cache=True) == no_colour_rich_markup(sections)
+
+    assert len(chat._render_cache) == 5
+
+
+def test_renderables_are_not_cached():
+    chat._render_cache.clear()
+    table = _table()
+    table.add_row(Text("c"), "3")
+    no_colour_rich_markup(table, cache=True)
+    assert not chat._render_cache
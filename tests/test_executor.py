@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import pytest
+
+from vexutils import executor
+from vexutils.executor import offload, run_off_loop, set_cog_limit
+
+
+@offload("ExecutorTest", mode="process")
+def square(x):
+    return x * x
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    yield
+    executor._cogs.clear()
+    for pool in executor._executors.values():
+        pool.shutdown()
+    executor._executors.clear()
+
+
+def test_offload_to_process():
+    assert asyncio.run(square(7)) == 49
+
+
+def test_offload_to_process_needs_module_level_function():
+    with pytest.raises(ValueError):
+
+        @offload("ExecutorTest", mode="process")
+        def nested(x):
+            return x
+
+
+def test_limit_changed_while_running():
+    release = threading.Event()
+    running = []
+    peak = []
+
+    def job():
+        running.append(1)
+        peak.append(len(running))
+        release.wait(5)
+        running.pop()
+
+    async def run():
+        jobs = [asyncio.ensure_future(run_off_loop("ExecutorTest", job)) for _ in range(6)]
+        await asyncio.sleep(0.1)
+        assert len(running) == 2  # the default limit
+
+        set_cog_limit("ExecutorTest", 3)
+        await asyncio.sleep(0.1)
+        assert len(running) == 3
+
+        set_cog_limit("ExecutorTest", 1)  # running jobs carry on, no more start until under 1
+        release.set()
+        await asyncio.wait_for(asyncio.gather(*jobs), 5)
+
+    asyncio.run(run())
+
+    assert max(peak) == 3
+    assert peak[3:] == [1, 1, 1]
+    state = executor._cogs["ExecutorTest"]
+    assert state["excess"] == 0
+    assert not state["semaphore"].locked()  # exactly one slot free, not more or less
+    assert state["semaphore"]._value == 1
+
+
+def test_cancelled_caller_keeps_slot_until_job_finishes():
+    release = threading.Event()
+    running = []
+
+    def job():
+        running.append(1)
+        release.wait(5)
+        running.pop()
+
+    async def run():
+        set_cog_limit("ExecutorTest", 1)
+        first = asyncio.ensure_future(run_off_loop("ExecutorTest", job))
+        await asyncio.sleep(0.05)
+        first.cancel()
+        await asyncio.sleep(0.05)
+        assert len(running) == 1  # the thread carries on
+
+        second = asyncio.ensure_future(run_off_loop("ExecutorTest", job))
+        await asyncio.sleep(0.05)
+        assert len(running) == 1  # so the limit still counts it
+        stats = executor.offload_stats("ExecutorTest")["ExecutorTest"]
+        assert stats["running"] == 1 and stats["queued"] == 1
+
+        shutdown = asyncio.ensure_future(executor.shutdown_cog("ExecutorTest"))
+        await asyncio.sleep(0.05)
+        assert not shutdown.done()  # waits for the cancelled caller's job
+        release.set()
+        await asyncio.wait_for(shutdown, 5)
+        with pytest.raises(RuntimeError):
+            await second
+
+    asyncio.run(run())
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+from pathlib import Path
+
+# these are slow to import, so importing the utils for get_vex_logger shouldn't import them
+SLOW_MODULES = ("aiohttp", "rich", "kaleido")
+
+# Red imports some of them itself (eg discord.py needs aiohttp), so it's imported first and only
+# what's imported after the marker is from the utils
+SCRIPT = """
+import sys
+import redbot.core.bot, redbot.core.commands, redbot.core.data_manager
+print("MARKER", file=sys.stderr, flush=True)
+import vexutils
+vexutils.get_vex_logger
+"""
+
+
+def _imported_by_utils() -> list:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    lines = result.stderr.splitlines()
+    # each line is "import time: self [us] | cumulative | imported package"
+    start = lines.index("MARKER") + 1
+    after = lines[start:]
+    return [line.rsplit("|", 1)[1].strip() for line in after if line.startswith("import time:")]
+
+
+def test_get_vex_logger_does_not_import_slow_modules():
+    modules = _imported_by_utils()
+
+    assert "vexutils" in modules
+    slow = [m for m in modules if m.split(".")[0] in SLOW_MODULES]
+    assert not slow, f"importing vexutils imported {slow}"
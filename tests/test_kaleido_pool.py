@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pytest
+
+from vexutils import kaleido_pool
+from vexutils.kaleido_pool import KaleidoPool, close_kaleido_pool, get_kaleido_pool
+
+
+class FakeKaleido:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def calc_fig(self, fig, opts):
+        self.calls += 1
+        await asyncio.sleep(0.1)
+        return b"png"
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def kaleido(monkeypatch):
+    kaleido = FakeKaleido()
+
+    async def start_renderer(data):
+        data["open"] += 1
+        return {"kaleido": kaleido, "renders": 0, "last_used": time.monotonic()}
+
+    monkeypatch.setattr(kaleido_pool, "_start_renderer", start_renderer)
+    return kaleido
+
+
+def test_first_caller_cancelled_others_still_get_image(kaleido):
+    async def run():
+        pool = KaleidoPool()
+        fig = {"data": [], "layout": {}}
+        first = asyncio.ensure_future(pool.render(fig))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(pool.render(fig))
+        await asyncio.sleep(0.01)
+
+        first.cancel()
+        assert await second == b"png"
+        assert first.cancelled()
+        assert await pool.render(fig) == b"png"  # from the cache
+        await pool.close()
+
+    asyncio.run(run())
+
+    assert kaleido.calls == 1
+
+
+def test_only_plain_data_is_shared(kaleido):
+    async def run():
+        pool = get_kaleido_pool(cache_size=0)
+        await pool.render({"data": []})
+        shared = kaleido_pool._state["pool"]
+        # other cogs' copies of the utils only ever see a dict, and wrap it with their own code
+        assert type(shared) is dict
+        assert get_kaleido_pool().stats()["renders"] == 1
+        await close_kaleido_pool()
+
+    asyncio.run(run())
+
+
+def test_close_waits_for_idle_browsers_closing(kaleido):
+    closed = []
+
+    async def close():
+        await asyncio.sleep(0.05)
+        closed.append(True)
+
+    kaleido.close = close
+
+    async def run():
+        pool = KaleidoPool(idle_timeout=0.01, cache_size=0)
+        await pool.render({"data": []})
+        await asyncio.sleep(0.02)  # the idle check has started closing the browser
+        assert len(pool._data["closing"]) == 1
+        await pool.close()
+        assert closed == [True]
+        assert not pool._data["closing"]
+
+    asyncio.run(run())
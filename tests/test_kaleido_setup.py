@@ -0,0 +1,69 @@
+import asyncio
+import importlib
+import json
+import sys
+import time
+import types
+
+import pytest
+
+from vexutils.kaleido_setup import kaleido_setup, kaleido_status, wait_for_kaleido
+
+# vexutils.kaleido_setup is also the name of the function, so get the module itself
+setup_mod = importlib.import_module("vexutils.kaleido_setup")
+
+DOWNLOAD_TIME = 0.5
+
+
+@pytest.fixture
+def stub_kaleido(monkeypatch, data_path, tmp_path):
+    """A kaleido module whose Chromium download is slow, with Chromium not installed."""
+    chrome = tmp_path / "chrome"
+
+    async def get_chrome():
+        await asyncio.sleep(DOWNLOAD_TIME)
+        chrome.write_text("")
+        chrome.chmod(0o755)
+        return chrome
+
+    module = types.ModuleType("kaleido")
+    module.get_chrome = get_chrome  # type: ignore
+    module.__version__ = "1.0.0"  # type: ignore
+    monkeypatch.setitem(sys.modules, "kaleido", module)
+    monkeypatch.setattr(setup_mod, "_find_chrome", lambda: None)
+    monkeypatch.setattr(setup_mod, "_chrome_version", lambda path: "Chromium 1.2.3")
+    monkeypatch.setattr(setup_mod, "_state", {"status": "not started"})
+    return chrome
+
+
+def test_setup_does_not_block_cog_load(stub_kaleido, data_path):
+    async def run():
+        start = time.monotonic()
+        assert await kaleido_setup() is False  # like a cog's load, not waiting
+        assert time.monotonic() - start < DOWNLOAD_TIME / 5
+        await asyncio.sleep(0.05)  # let the background task start the download
+        assert kaleido_status()["status"] == "downloading"
+
+        assert await wait_for_kaleido(5) is True
+
+    asyncio.run(run())
+
+    status = kaleido_status()
+    assert status["status"] == "ready"
+    assert status["path"] == str(stub_kaleido)
+    assert status["version"] == "Chromium 1.2.3"
+    with open(data_path / setup_mod.CACHE_FILE) as fp:
+        assert json.load(fp)["path"] == str(stub_kaleido)
+
+
+def test_cached_path_is_used(stub_kaleido, data_path):
+    asyncio.run(wait_for_kaleido(5))
+    setup_mod._state.clear()
+    setup_mod._state["status"] = "not started"
+
+    async def run():
+        start = time.monotonic()
+        assert await kaleido_setup() is True  # found straight away, from the cache
+        assert time.monotonic() - start < DOWNLOAD_TIME / 5
+
+    asyncio.run(run())
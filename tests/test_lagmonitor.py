@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from vexutils import lagmonitor
+from vexutils.lagmonitor import current_lag_monitor, start_lag_monitor, stop_lag_monitor
+
+
+def test_blocked_loop_is_measured():
+    async def run():
+        monitor = start_lag_monitor(interval=0.05, threshold=0.1, capture_stacks=True)
+        await asyncio.sleep(0.1)
+        time.sleep(0.3)  # block the loop
+        await asyncio.sleep(0.1)
+        stats = current_lag_monitor().stats()
+        stop_lag_monitor()
+        return monitor, stats
+
+    monitor, stats = asyncio.run(run())
+
+    assert stats["blocked"] >= 1
+    assert stats["max"] >= 0.2
+    assert "time.sleep(0.3)" in monitor.stacks[-1][2]
+    assert not monitor.running
+    assert current_lag_monitor() is None
+
+
+def test_only_plain_data_is_shared():
+    async def run():
+        first = start_lag_monitor(interval=0.05)
+        second = start_lag_monitor(interval=1.0)  # already running, so this is ignored
+        await asyncio.sleep(0.2)
+        shared = lagmonitor._state["monitor"]
+        stop_lag_monitor()
+        return first, second, shared
+
+    first, second, shared = asyncio.run(run())
+
+    # other cogs' copies of the utils only ever see a dict, and wrap it with their own code
+    assert type(shared) is dict
+    assert second.interval == 0.05
+    assert second.lags is first.lags and len(first.lags) >= 2
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import time
+
+from aiohttp import web
+from redbot.core import VersionInfo
+
+from vexutils import meta
+
+DELAY = 0.2
+
+
+async def _start_stub(requests: list) -> web.AppRunner:
+    async def handle(request: web.Request, data: dict) -> web.Response:
+        start = time.monotonic()
+        await asyncio.sleep(DELAY)
+        peer = request.transport.get_extra_info("peername")
+        requests.append((request.path, start, time.monotonic(), peer[1]))
+        return web.json_response(data)
+
+    async def vers(request: web.Request) -> web.Response:
+        cog = request.match_info["cog"]
+        return await handle(request, {cog: "1.2.3", "utils": "abcdef0123"})
+
+    async def pypi(request: web.Request) -> web.Response:
+        return await handle(request, {"info": {"version": "3.5.0"}})
+
+    app = web.Application()
+    app.router.add_get("/vers/{cog}", vers)
+    app.router.add_get("/pypi", pypi)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+def test_latest_vers_fetched_concurrently_with_one_session(data_path, monkeypatch):
+    requests: list = []
+
+    async def run():
+        runner = await _start_stub(requests)
+        port = runner.addresses[0][1]
+        monkeypatch.setattr(meta, "VEXCODES_VERS_URL", f"http://127.0.0.1:{port}/vers/{{}}")
+        monkeypatch.setattr(meta, "RED_PYPI_URL", f"http://127.0.0.1:{port}/pypi")
+        meta._version_cache.clear()
+        meta._version_inflight.clear()
+        meta._version_state["loaded_disk"] = True
+        try:
+            start = time.monotonic()
+            vers = await meta._get_latest_vers("TestCog")
+            elapsed = time.monotonic() - start
+            session = meta._get_session()
+
+            meta._version_cache.clear()
+            await meta._get_latest_vers("TestCog")
+            assert meta._get_session() is session
+        finally:
+            await meta.close_http_session()
+            await runner.cleanup()
+        return vers, elapsed
+
+    vers, elapsed = asyncio.run(run())
+
+    assert str(vers.cog) == "1.2.3"
+    assert vers.utils == "abcdef0"
+    assert str(vers.red) == "3.5.0"
+
+    # both fetches were in flight at once
+    first, second = requests[0], requests[1]
+    assert {first[0], second[0]} == {"/vers/TestCog", "/pypi"}
+    assert max(first[1], second[1]) < min(first[2], second[2])
+    assert elapsed < DELAY * 2
+
+    # the second round reused the first round's pooled connections
+    assert {r[3] for r in requests[2:]} <= {r[3] for r in requests[:2]}
+
+
+def test_cogs_queued_during_a_batched_check_are_checked(monkeypatch):
+    checked: list = []
+
+    async def check_all(cogs):
+        checked.append(sorted(cogs))
+        if len(checked) == 1:  # a cog is queued while the first batch is being checked
+            meta.schedule_out_of_date_check(bot, "late", "1.0.0")
+        await asyncio.sleep(0.01)
+        return {cog: False for cog in cogs}
+
+    class Bot:
+        async def wait_until_red_ready(self):
+            pass
+
+    bot = Bot()
+    monkeypatch.setattr(meta, "OOD_CHECK_DELAY", 0.01)
+    monkeypatch.setattr(meta, "out_of_date_check_all", check_all)
+    meta._ood_pending.clear()
+    meta._ood_state.clear()
+
+    async def run():
+        meta.schedule_out_of_date_check(bot, "a", "1.0.0")
+        await meta._ood_state["task"]
+
+    asyncio.run(run())
+
+    assert checked == [["a"], ["late"]]
+    assert not meta._ood_pending
+
+
+def test_commit_file_only_read_again_when_changed(monkeypatch, tmp_path):
+    commit_file = tmp_path / "commit.json"
+    commit_file.write_text('{"latest_commit": "abcdef0123"}')
+    monkeypatch.setattr(meta, "COMMIT_FILE", commit_file)
+    monkeypatch.setattr(meta, "_commit_cache", None)
+    assert meta._get_current_utils() == "abcdef0"
+
+    reads = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *a, **k: reads.append(a) or real_open(*a, **k))
+    assert meta._get_current_utils() == "abcdef0"
+    assert not reads
+
+    commit_file.write_text('{"latest_commit": "1234567890"}')
+    os.utime(commit_file, (0, 0))  # mtime might not change otherwise, if it's the same second
+    assert meta._get_current_utils() == "1234567"
+    assert len(reads) == 1
+
+
+def test_versions_table_is_cached(monkeypatch):
+    monkeypatch.setattr(meta, "_versions_table_cache", {})
+    current = meta.Vers(
+        "Test", VersionInfo.from_str("1.0.0"), "abcdef0", VersionInfo.from_str("3.5.0")
+    )
+
+    first = meta._render_versions_table(current, current, True, True, True)
+    assert first is meta._render_versions_table(current, current, True, True, True)
+    assert len(meta._versions_table_cache) == 1
+
+    assert meta._render_versions_table(current, current, False, True, True) != first
+    assert len(meta._versions_table_cache) == 2
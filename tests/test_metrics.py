@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+
+from vexutils.loop import VexLoop
+from vexutils.metrics import (
+    JSONExporter,
+    MetricsExporter,
+    PrometheusExporter,
+    loop_snapshot,
+    start_metrics_server,
+)
+
+
+def test_exporter_must_implement_render():
+    class Incomplete(MetricsExporter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()  # type: ignore
+
+
+def test_loops_with_same_labels_are_separate_series():
+    # eg one left over from before a reload, or two cogs that didn't set a cog name
+    loops = [VexLoop("Same loop", 60), VexLoop("Same loop", 60)]
+
+    body = PrometheusExporter().render(
+        [loop for loop in loop_snapshot() if loop["loop"] == "Same loop"]
+    )
+
+    series = [line.rsplit(" ", 1)[0] for line in body.splitlines() if line.startswith("vex_loop_")]
+    assert len(series) == len(set(series))
+    for loop in loops:
+        assert f'id="{id(loop):x}"' in body
+
+
+def test_metrics_server_serves_both_formats():
+    loop = VexLoop("Served loop", 60, cog_name="Test")
+
+    async def scrape(exporter):
+        runner = await start_metrics_server(port=0, exporter=exporter)
+        port = runner.addresses[0][1]
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                    return resp.status, resp.headers["Content-Type"], await resp.text()
+        finally:
+            await runner.cleanup()
+
+    status, content_type, body = asyncio.run(scrape(None))
+    assert status == 200
+    assert content_type.startswith("text/plain")
+    labels = f'cog="Test",loop="Served loop",id="{id(loop):x}"'
+    assert f"vex_loop_iterations_total{{{labels}}} 0.0" in body
+
+    status, content_type, body = asyncio.run(scrape(JSONExporter()))
+    assert status == 200
+    assert content_type.startswith("application/json")
+    served = [m for m in json.loads(body) if m["id"] == f"{id(loop):x}"]
+    assert served[0]["loop"] == "Served loop" and served[0]["cog"] == "Test"
@@ -0,0 +1,107 @@
+import asyncio
+import sqlite3
+
+import numpy
+import pandas
+
+from vexutils import npydriver, sqldriver
+from vexutils.npydriver import PandasNpyDriver, _read_meta
+from vexutils.sqldriver import PandasSQLiteDriver
+
+
+class Bot:
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+
+
+def _frame(start: str, periods: int) -> pandas.DataFrame:
+    index = pandas.date_range(start, periods=periods, freq="1min")
+    return pandas.DataFrame({"value": [float(i) for i in range(periods)]}, index=index)
+
+
+def _make_source(path) -> None:
+    # made without pandas, so there's no index on the index column for a read to add
+    connection = sqlite3.connect(path)
+    connection.execute(
+        'CREATE TABLE main_df ("index" TIMESTAMP, value REAL, late REAL, gone REAL)'
+    )
+    connection.executemany(
+        "INSERT INTO main_df VALUES (?, ?, ?, NULL)",
+        [
+            (f"2024-01-01 00:{i:02}:00", float(i), None if i < 5 else float(i * 10))
+            for i in range(12)
+        ],
+    )
+    connection.execute('CREATE TABLE empty ("index" TIMESTAMP, value REAL, other REAL)')
+    connection.commit()
+    connection.close()
+
+
+def test_migrate_from_sqlite(monkeypatch, tmp_path):
+    monkeypatch.setattr(sqldriver, "cog_data_path", lambda **kwargs: tmp_path)
+    monkeypatch.setattr(npydriver, "cog_data_path", lambda **kwargs: tmp_path)
+    _make_source(tmp_path / "test.db")
+    before = (tmp_path / "test.db").read_bytes()
+
+    async def run():
+        source = PandasSQLiteDriver(Bot(), "Test", "test.db")
+        driver = PandasNpyDriver(Bot(), "Test", "npy")
+        # chunks of 5, so the first chunk of late is all NULL
+        await driver.migrate_from_sqlite(source, ["main_df", "empty"], chunksize=5)
+        df = await driver.read()
+        empty = await driver.read(table="empty")
+        await source.close()
+        await driver.close()
+        return df, empty
+
+    df, empty = asyncio.run(run())
+
+    assert list(df.index) == list(pandas.date_range("2024-01-01", periods=12, freq="1min"))
+    assert list(df["value"]) == [float(i) for i in range(12)]
+    assert numpy.isnan(df["late"][:5]).all()
+    assert list(df["late"][5:]) == [float(i * 10) for i in range(5, 12)]
+    assert df["gone"].dtype == "float64"
+    assert df["gone"].isna().all()
+    assert len(_read_meta(tmp_path / "npy" / "main_df")["segments"]) == 1
+
+    assert empty.empty
+    assert list(empty.columns) == ["value", "other"]
+    assert isinstance(empty.index, pandas.DatetimeIndex)
+
+    assert (tmp_path / "test.db").read_bytes() == before
+    connection = sqlite3.connect(tmp_path / "test.db")
+    indexes = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()
+    connection.close()
+    assert indexes == []
+
+
+def test_compact_merges_small_segments(monkeypatch, tmp_path):
+    monkeypatch.setattr(npydriver, "cog_data_path", lambda **kwargs: tmp_path)
+    path = tmp_path / "npy" / "main_df"
+
+    async def run():
+        driver = PandasNpyDriver(Bot(), "Test", "npy", compact_segments=4)
+        await driver.write(_frame("2024-01-01", 2))
+        for i in range(2):
+            await driver.append(_frame(f"2024-01-01 00:{2 + i * 2:02}", 2))
+        assert len(_read_meta(path)["segments"]) == 3  # under compact_segments
+
+        await driver.append(_frame("2024-01-01 00:06", 2))
+        assert len(_read_meta(path)["segments"]) == 1  # merged once there are 4
+
+        await driver.append(_frame("2024-01-01 00:08", 2))
+        assert len(_read_meta(path)["segments"]) == 2
+        await driver.compact()
+        df = await driver.read()
+        await driver.close()
+        return df
+
+    df = asyncio.run(run())
+
+    meta = _read_meta(path)
+    assert len(meta["segments"]) == 1
+    assert sorted(p.name for p in path.iterdir()) == sorted(
+        [meta["segments"][0]["name"], npydriver.META_FILE]
+    )
+    assert list(df.index) == list(pandas.date_range("2024-01-01", periods=10, freq="1min"))
+    assert list(df["value"]) == [0.0, 1.0] * 5
@@ -0,0 +1,121 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from vexutils.sender import MessageSender
+
+DELAY = 0.05
+
+
+class FakeDiscord:
+    """Stands in for HTTPClient.request, recording each message as it's sent."""
+
+    def __init__(self, rate_limit_first: int = 0) -> None:
+        self.sent: list = []  # (channel ID, content)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rate_limit_first = rate_limit_first
+        self.attempts = 0
+
+    async def request(self, route, *, form):
+        self.attempts += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(DELAY)
+            if self.attempts <= self.rate_limit_first:
+                response = SimpleNamespace(
+                    status=429, reason="Too Many Requests", headers={"Retry-After": "0.05"}
+                )
+                raise discord.HTTPException(response, "You are being rate limited.")
+            content = json.loads(form[0]["value"])["content"]
+            self.sent.append((route.channel_id, content))
+            return {"id": str(len(self.sent)), "channel_id": str(route.channel_id)}
+        finally:
+            self.in_flight -= 1
+
+
+def test_messages_to_a_channel_stay_in_order():
+    fake = FakeDiscord()
+
+    async def run():
+        sender = MessageSender(None, request=fake.request)
+        await asyncio.gather(
+            *(sender.send(channel, content=str(i)) for i in range(5) for channel in (1, 2))
+        )
+        await sender.close()
+
+    asyncio.run(run())
+
+    for channel in (1, 2):
+        assert [c for ch, c in fake.sent if ch == channel] == [str(i) for i in range(5)]
+
+
+def test_concurrency_is_capped():
+    fake = FakeDiscord()
+
+    async def run():
+        sender = MessageSender(None, max_concurrency=3, request=fake.request)
+        results = await sender.broadcast(range(10), content="alert")
+        await sender.close()
+        return results
+
+    results = asyncio.run(run())
+
+    assert fake.max_in_flight == 3
+    assert sorted(ch for ch, _ in fake.sent) == list(range(10))
+    assert all(isinstance(r, dict) for r in results.values())
+
+
+def test_rate_limited_message_is_retried():
+    fake = FakeDiscord(rate_limit_first=2)
+
+    async def run():
+        sender = MessageSender(None, max_retries=3, request=fake.request)
+        result = await sender.send(1, content="hi")
+        stats = sender.stats()
+        await sender.close()
+        return result, stats
+
+    result, stats = asyncio.run(run())
+
+    assert result["channel_id"] == "1"
+    assert fake.attempts == 3
+    assert stats["rate_limited"] == 2 and stats["sent"] == 1
+
+
+def test_rate_limited_too_many_times():
+    fake = FakeDiscord(rate_limit_first=10)
+
+    async def run():
+        sender = MessageSender(None, max_retries=1, request=fake.request)
+        try:
+            await sender.send(1, content="hi")
+        finally:
+            await sender.close()
+
+    with pytest.raises(discord.HTTPException):
+        asyncio.run(run())
+    assert fake.attempts == 2
+
+
+def test_close_without_draining_fails_queued_sends():
+    fake = FakeDiscord()
+
+    async def run():
+        sender = MessageSender(None, request=fake.request)
+        sends = [asyncio.ensure_future(sender.send(1, content=str(i))) for i in range(5)]
+        await asyncio.sleep(DELAY / 2)  # the first is in flight
+        await sender.close(drain=False)
+        results = await asyncio.gather(*sends, return_exceptions=True)
+        with pytest.raises(RuntimeError):
+            await sender.send(1, content="after")
+        return results
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert fake.sent == []
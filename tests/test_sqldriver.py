@@ -0,0 +1,111 @@
+import asyncio
+import sqlite3
+
+import pandas
+
+from vexutils import sqldriver
+from vexutils.sqldriver import PandasSQLiteDriver
+
+
+class Bot:
+    def __init__(self) -> None:
+        self.loop = asyncio.get_running_loop()
+
+
+def _frame(start: str, periods: int) -> pandas.DataFrame:
+    index = pandas.date_range(start, periods=periods, freq="1min")
+    return pandas.DataFrame({"value": [float(i) for i in range(periods)]}, index=index)
+
+
+def test_connection_is_kept_open_in_wal_mode(monkeypatch, tmp_path):
+    monkeypatch.setattr(sqldriver, "cog_data_path", lambda **kwargs: tmp_path)
+
+    async def run():
+        driver = PandasSQLiteDriver(Bot(), "Test", "test.db")
+        await driver.write(_frame("2024-01-01", 5))
+        connection = driver._connection
+        await driver.append(_frame("2024-01-01 00:05", 5))
+        df = await driver.read()
+
+        assert driver._connection is connection
+        mode = await driver.bot.loop.run_in_executor(
+            driver.sql_executor,
+            lambda: connection.execute("PRAGMA journal_mode").fetchone()[0],
+        )
+        await driver.close()
+        assert driver._connection is None
+        return df, mode
+
+    df, mode = asyncio.run(run())
+
+    assert mode == "wal"
+    assert len(df) == 10
+
+
+def test_read_range_with_aware_bounds(monkeypatch, tmp_path):
+    monkeypatch.setattr(sqldriver, "cog_data_path", lambda **kwargs: tmp_path)
+
+    async def run():
+        driver = PandasSQLiteDriver(Bot(), "Test", "test.db")
+        await driver.write(_frame("2024-01-01", 10))  # naive, in UTC
+        # 01:02 in UTC+1 is 00:02 UTC
+        start = pandas.Timestamp("2024-01-01 01:02", tz="Etc/GMT-1")
+        end = pandas.Timestamp("2024-01-01 00:05", tz="UTC")
+        df = await driver.read_range(start, end)
+        await driver.close()
+        return df
+
+    df = asyncio.run(run())
+
+    assert list(df["value"]) == [2.0, 3.0, 4.0]
+
+
+def test_write_after_stopping_chunks_early(monkeypatch, tmp_path):
+    monkeypatch.setattr(sqldriver, "cog_data_path", lambda **kwargs: tmp_path)
+
+    async def run():
+        driver = PandasSQLiteDriver(Bot(), "Test", "test.db")
+        await driver.write(_frame("2024-01-01", 500))
+
+        async for _ in driver.iter_chunks(100):
+            break
+        await driver.write(_frame("2024-01-01", 300))  # the cursor's table is dropped
+
+        seen = 0
+        async for chunk in driver.iter_chunks(100):
+            if not seen:
+                await driver.write(_frame("2024-01-01", 200))
+                await driver.append(_frame("2024-01-02", 50))
+            seen += len(chunk)
+
+        df = await driver.read()
+        await driver.close()
+        return seen, df
+
+    seen, df = asyncio.run(run())
+
+    assert seen == 300  # the snapshot from when iterating started
+    assert len(df) == 250
+
+
+def test_close_waits_for_timed_flush(monkeypatch, tmp_path):
+    monkeypatch.setattr(sqldriver, "cog_data_path", lambda **kwargs: tmp_path)
+
+    async def run():
+        driver = PandasSQLiteDriver(
+            Bot(), "Test", "test.db", write_behind=True, flush_interval=0.01
+        )
+        await driver.append(_frame("2024-01-01", 5))
+        while driver._flush_task is None:  # the timer has fired and started a flush
+            await asyncio.sleep(0.001)
+        task = driver._flush_task
+        await driver.close()
+        return task
+
+    task = asyncio.run(run())
+
+    assert task.done()
+    connection = sqlite3.connect(tmp_path / "test.db")
+    count = connection.execute("SELECT COUNT(*) FROM main_df").fetchone()[0]
+    connection.close()
+    assert count == 5
@@ -0,0 +1,134 @@
+import asyncio
+import io
+import json
+
+import aiohttp
+import discord
+import pytest
+from aiohttp import web
+from discord.http import HTTPClient, Route
+
+from vexutils import url_buttons
+from vexutils.url_buttons import StreamedFile, send_message
+
+
+class Bot:
+    def __init__(self, http: HTTPClient) -> None:
+        self._connection = type("Connection", (), {"http": http})()
+
+
+async def _start_stub(uploads: list, fail_first: bool) -> web.AppRunner:
+    """A channel messages endpoint that records the size of each uploaded file."""
+
+    async def messages(request: web.Request) -> web.Response:
+        files = []
+        if request.content_type.startswith("multipart/"):
+            async for part in await request.multipart():
+                if part.name != "payload_json":
+                    files.append((part.filename, len(await part.read())))
+        uploads.append(files)
+        if fail_first and len(uploads) == 1:
+            return web.Response(status=500)
+        attachments = [
+            {"id": str(i), "filename": name, "url": f"https://cdn.example/{len(uploads)}/{name}"}
+            for i, (name, _) in enumerate(files)
+        ]
+        body = json.dumps({"id": "1", "attachments": attachments}).encode()
+        return web.Response(body=body, content_type="application/json")
+
+    app = web.Application()
+    app.router.add_post("/channels/{channel_id}/messages", messages)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    return runner
+
+
+async def _send(monkeypatch, uploads: list, *, fail_first: bool = False, **kwargs):
+    runner = await _start_stub(uploads, fail_first)
+    port = runner.addresses[0][1]
+    monkeypatch.setattr(Route, "BASE", f"http://127.0.0.1:{port}")
+
+    http = HTTPClient(asyncio.get_running_loop())
+    http.token = "token"
+    http._HTTPClient__session = aiohttp.ClientSession()  # type: ignore
+    http._global_over = asyncio.Event()
+    http._global_over.set()
+    try:
+        return await send_message(Bot(http), 1, **kwargs)
+    finally:
+        await http._HTTPClient__session.close()  # type: ignore
+        await runner.cleanup()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    url_buttons._attachment_cache.clear()
+    yield
+    url_buttons._attachment_cache.clear()
+
+
+def test_streamed_file_is_not_retried(monkeypatch):
+    async def chunks():
+        for _ in range(4):
+            yield b"x" * 1000
+
+    uploads: list = []
+    embed = discord.Embed().set_image(url="attachment://graph.png")
+    streamed = StreamedFile(chunks(), "graph.png")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(_send(monkeypatch, uploads, fail_first=True, embed=embed, files=[streamed]))
+
+    assert uploads == [[("graph.png", 4000)]]  # the failed attempt, with no empty retry
+    assert not url_buttons._attachment_cache
+
+
+def test_file_is_retried(monkeypatch):
+    uploads: list = []
+    embed = discord.Embed().set_image(url="attachment://graph.png")
+    file = discord.File(io.BytesIO(b"png" * 1000), "graph.png")
+
+    asyncio.run(_send(monkeypatch, uploads, fail_first=True, embed=embed, file=file))
+
+    assert uploads == [[("graph.png", 3000)], [("graph.png", 3000)]]
+    assert len(url_buttons._attachment_cache) == 1
+
+
+def test_files_only_hashed_when_they_could_be_reused(monkeypatch):
+    hashed = []
+    hash_file = url_buttons._hash_file
+    monkeypatch.setattr(url_buttons, "_hash_file", lambda f: hashed.append(f) or hash_file(f))
+
+    def file(name: str) -> discord.File:
+        return discord.File(io.BytesIO(b"png" * 1000), name)
+
+    uploads: list = []
+    embed = discord.Embed().set_image(url="attachment://graph.png")
+    asyncio.run(_send(monkeypatch, uploads, content="no embed", file=file("graph.png")))
+    asyncio.run(
+        _send(monkeypatch, uploads, embed=embed, file=file("graph.png"), reuse_attachments=False)
+    )
+    assert not hashed
+
+    used, unused = file("graph.png"), file("other.png")
+    asyncio.run(_send(monkeypatch, uploads, embed=embed, files=[used, unused]))
+    assert hashed == [used]
+
+    # now it's cached, the same graph isn't uploaded again
+    embed = discord.Embed().set_image(url="attachment://graph.png")
+    asyncio.run(_send(monkeypatch, uploads, embed=embed, file=file("graph.png")))
+    assert uploads[-1] == []
+
+
+def test_same_embed_sent_more_than_once(monkeypatch):
+    uploads: list = []
+    embed = discord.Embed().set_image(url="attachment://graph.png")
+
+    for _ in range(3):
+        file = discord.File(io.BytesIO(b"png" * 1000), "graph.png")
+        asyncio.run(_send(monkeypatch, uploads, embed=embed, file=file))
+        assert embed.image.url == "attachment://graph.png"
+
+    # uploaded once, then the CDN URL is used with nothing uploaded
+    assert uploads == [[("graph.png", 3000)], [], []]
@@ -1,9 +1,50 @@
-from typing import TYPE_CHECKING, Optional
+import importlib
+from typing import TYPE_CHECKING, Any, List
 
-import discord
-from redbot.core.bot import Red
-
-from .chat import humanize_bytes, inline_hum_list, no_colour_rich_markup
-from .meta import format_help, format_info, get_vex_logger, out_of_date_check
-from .kaleido_setup import kaleido_setup
 from .version import __version__
+
+# submodules are only imported when something from them is first used, so a cog that only wants
+# get_vex_logger doesn't pay for aiohttp, rich, kaleido etc on load
+
+# name: submodule it's in
+_LAZY = {
+    "humanize_bytes": "chat",
+    "humanize_bytes_many": "chat",
+    "inline_hum_list": "chat",
+    "no_colour_rich_markup": "chat",
+    "close_http_session": "meta",
+    "format_help": "meta",
+    "format_info": "meta",
+    "get_vex_logger": "meta",
+    "out_of_date_check": "meta",
+    "out_of_date_check_all": "meta",
+    "schedule_out_of_date_check": "meta",
+    "kaleido_setup": "kaleido_setup",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value  # so this is only called once per name
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted({*globals(), *_LAZY})
+
+
+if TYPE_CHECKING:
+    from .chat import humanize_bytes, humanize_bytes_many, inline_hum_list, no_colour_rich_markup
+    from .kaleido_setup import kaleido_setup
+    from .meta import (
+        close_http_session,
+        format_help,
+        format_info,
+        get_vex_logger,
+        out_of_date_check,
+        out_of_date_check_all,
+        schedule_out_of_date_check,
+    )
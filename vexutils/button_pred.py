@@ -2,15 +2,49 @@
 # until dpy2
 
 import asyncio
+import heapq
+import math
+import os
+import sys
 from dataclasses import dataclass
-from typing import Any, List, Optional
+from typing import Any, Container, Dict, List, Optional, Sequence
 
 import discord
 from redbot.core import commands
+from redbot.core.bot import Red
 
 if discord.__version__.startswith("1"):
     raise RuntimeError("This requires discord.py 2.X")
-from discord import ButtonStyle, Embed, Interaction, ui
+from discord import ButtonStyle, Embed, Interaction, InteractionType, ui
+
+from .shared import get_shared
+
+# with dispatcher=True, prompts don't get their own View. the buttons are sent from a View that's
+# already stopped so discord.py doesn't keep it, and presses are routed by custom_id from one
+# on_interaction listener shared by every cog. each open prompt is a small record, and they all
+# expire from a single timer on a heap, rather than a View timeout task plus asyncio.wait_for each
+
+CUSTOM_ID_PREFIX = "vexpred"
+
+# shared, so there's one listener for the whole bot whichever cog adds it. it's plain data, as
+# cogs can have different versions of the utils: the listener and timer are this module's
+# functions, and the newest copy to open a prompt takes them over, so code from an unloaded or
+# older copy doesn't keep running. prompts are dicts of expires and the press, expire and size
+# callbacks, from the copy that opened them. the key's version changes if the layout does
+_state: Dict[str, Any] = get_shared(
+    "pred_dispatcher_v2",
+    lambda: {
+        "bot": None,
+        "listener": None,
+        "prompts": {},  # prompt ID: record
+        "heap": [],  # (expires, prompt ID), in loop time
+        "timer": None,
+        "timer_when": math.inf,
+        "pressed": 0,
+        "expired": 0,
+        "stale": 0,
+    },
+)
 
 
 @dataclass
@@ -69,6 +103,7 @@ async def wait_for_press(
     embed: Optional[Embed] = None,
     *,
     timeout: float = 180.0,
+    dispatcher: bool = False,
 ) -> Any:
     """Wait for a single button press with customisable buttons.
 
@@ -86,6 +121,9 @@ async def wait_for_press(
         Embed of the message, by default None
     timeout : float, optional
         Button timeout, by default 180.0
+    dispatcher : bool, optional
+        Use the shared dispatcher instead of a View for this prompt, by default False. This uses
+        much less memory when lots of prompts are open at once, see `dispatcher_stats`
 
     Returns
     -------
@@ -102,6 +140,9 @@ async def wait_for_press(
     if not items:
         raise ValueError("The `items` argument cannot contain an empty list.")
 
+    if dispatcher:
+        return await _dispatched_press(ctx, items, content, embed, timeout)
+
     view = _PredView(timeout, ctx.author.id)  # type:ignore
     for i in items:
         button = _PredButton(i.ref, i.style, i.label, i.row)
@@ -131,6 +172,7 @@ async def wait_for_yes_no(
     embed: Optional[Embed] = None,
     *,
     timeout: float = 180.0,
+    dispatcher: bool = False,
 ) -> bool:
     """Wait for a single button press of pre-defined yes and no buttons, returning True for yes
     and False for no.
@@ -149,6 +191,8 @@ async def wait_for_yes_no(
         Embed of the message, by default None
     timeout : float, optional
         Button timeout, by default 180.0
+    dispatcher : bool, optional
+        Use the shared dispatcher instead of a View for this prompt, by default False
 
     Returns
     -------
@@ -160,6 +204,13 @@ async def wait_for_yes_no(
     asyncio.TimeoutError
         A button was not pressed in time.
     """
+    if dispatcher:
+        items = [
+            PredItem(True, ButtonStyle.blurple, "Yes"),
+            PredItem(False, ButtonStyle.blurple, "No"),
+        ]
+        return await _dispatched_press(ctx, items, content, embed, timeout)
+
     view = _PredView(timeout, ctx.author.id)  # type:ignore
     view.add_item(_PredButton(True, ButtonStyle.blurple, "Yes"))
     view.add_item(_PredButton(False, ButtonStyle.blurple, "No"))
@@ -187,3 +238,402 @@ async def wait_for_yes_no(
     emptyview.stop()
 
     return view.ref
+
+
+@dataclass
+class Collected:
+    """
+    The result of `collect_presses`.
+
+    `presses` is user ID: the `ref` of the button they pressed (their latest press, if they could
+    change it)
+
+    `counts` is how many users pressed each button, in the same order as the items
+
+    `quorum_reached` is whether it finished early from reaching the quorum
+    """
+
+    presses: Dict[int, Any]
+    counts: List[int]
+    quorum_reached: bool
+
+
+async def collect_presses(
+    ctx: commands.Context,
+    items: List[PredItem],
+    content: Optional[str] = None,
+    embed: Optional[Embed] = None,
+    *,
+    timeout: float = 60.0,
+    quorum: Optional[int] = None,
+    users: Optional[Container[int]] = None,
+    allow_change: bool = True,
+    tally: bool = True,
+    tally_interval: float = 5.0,
+) -> Collected:
+    """Collect button presses from many users on one message, for polls or "who's in" prompts.
+
+    Each user counts once. Presses go through the shared dispatcher, see `dispatcher_stats`.
+
+    Parameters
+    ----------
+    ctx : commands.Context
+        Context to send message to
+    items : List[PredItem]
+        List of items to send as buttons
+    content : Optional[str], optional
+        Content of the message, by default None
+    embed : Optional[Embed], optional
+        Embed of the message, by default None
+    timeout : float, optional
+        Seconds to collect presses for, by default 60.0
+    quorum : Optional[int], optional
+        Finish early once this many users have pressed, by default None (wait for the timeout)
+    users : Optional[Container[int]], optional
+        IDs of the users allowed to press, by default anyone
+    allow_change : bool, optional
+        Whether users can change their choice by pressing another button, by default True
+    tally : bool, optional
+        Whether to show the count on each button, by default True
+    tally_interval : float, optional
+        Minimum seconds between updates of the tally, by default 5.0. Presses in between are
+        shown together in the next update, to keep within rate limits
+
+    Returns
+    -------
+    Collected
+        The presses and counts
+
+    Raises
+    ------
+    ValueError
+        An empty list was supplied
+    """
+    if not items:
+        raise ValueError("The `items` argument cannot contain an empty list.")
+
+    _setup_dispatcher(ctx.bot)
+    collection = _Collection(items, timeout, quorum, users, allow_change, tally, tally_interval)
+    _add(collection)
+    try:
+        view = collection.live_view()
+        collection.message = await ctx.send(content=content, embed=embed, view=view)
+        await collection.future
+    finally:
+        _remove(collection.id)
+        collection.finish()
+
+    if collection.edit_task is not None:
+        await collection.edit_task  # so an older tally can't land after the final edit
+    if not collection.final_sent:
+        await collection.message.edit(view=collection.final_view())
+    return collection.result()
+
+
+def dispatcher_stats() -> Dict[str, int]:
+    """Get stats on prompts using the dispatcher, from every cog.
+
+    ``open`` is prompts waiting for a press now and ``memory_bytes`` is roughly how much memory
+    they use. The rest are counts since the bot started.
+    """
+    prompts, heap = _state["prompts"], _state["heap"]
+    memory = sys.getsizeof(prompts) + sys.getsizeof(heap)
+    memory += sum(sys.getsizeof(entry) for entry in heap)
+    memory += sum(sys.getsizeof(record) + record["size"]() for record in prompts.values())
+    return {
+        "open": len(prompts),
+        "pressed": _state["pressed"],
+        "expired": _state["expired"],
+        "stale": _state["stale"],
+        "memory_bytes": memory,
+    }
+
+
+def _setup_dispatcher(bot: Red) -> None:
+    """Make sure this copy's listener and timer callback are the ones in use."""
+    if _state["listener"] is _on_interaction and _state["bot"] is bot:
+        return
+    if _state["listener"] is not None:
+        _state["bot"].remove_listener(_state["listener"], "on_interaction")
+    bot.add_listener(_on_interaction, "on_interaction")
+    _state["listener"] = _on_interaction
+    _state["bot"] = bot
+    if _state["timer"] is not None:
+        _schedule(_state["timer_when"])
+
+
+def _add(prompt: Any) -> None:
+    _state["prompts"][prompt.id] = {
+        "expires": prompt.expires,
+        "press": prompt.press,
+        "expire": prompt.expire,
+        "size": prompt.size,
+    }
+    heapq.heappush(_state["heap"], (prompt.expires, prompt.id))
+    if prompt.expires < _state["timer_when"]:
+        _schedule(prompt.expires)
+
+
+def _remove(prompt_id: str) -> None:
+    prompts = _state["prompts"]
+    prompts.pop(prompt_id, None)
+    # finished prompts are only taken off the heap when they'd have expired, so tidy up if
+    # lots of them have built up
+    if len(_state["heap"]) > 2 * len(prompts) + 64:
+        _state["heap"] = [entry for entry in _state["heap"] if entry[1] in prompts]
+        heapq.heapify(_state["heap"])
+
+
+def _schedule(when: float) -> None:
+    if _state["timer"] is not None:
+        _state["timer"].cancel()
+    _state["timer_when"] = when
+    _state["timer"] = asyncio.get_running_loop().call_at(when, _expire)
+
+
+def _expire() -> None:
+    _state["timer"] = None
+    _state["timer_when"] = math.inf
+    heap = _state["heap"]
+    now = asyncio.get_running_loop().time()
+    while heap and heap[0][0] <= now:
+        _, prompt_id = heapq.heappop(heap)
+        record = _state["prompts"].pop(prompt_id, None)
+        if record is not None:
+            _state["expired"] += 1
+            record["expire"]()
+    if heap:
+        _schedule(heap[0][0])
+
+
+async def _on_interaction(interaction: Interaction) -> None:
+    if interaction.type != InteractionType.component:
+        return
+    prefix, _, rest = (interaction.data or {}).get("custom_id", "").partition(":")
+    if prefix != CUSTOM_ID_PREFIX:
+        return
+    prompt_id, _, index = rest.partition(":")
+
+    record = _state["prompts"].get(prompt_id)
+    if record is None:  # timed out, or from before a restart
+        _state["stale"] += 1
+        await interaction.response.send_message("This has expired.", ephemeral=True)
+        return
+    _state["pressed"] += 1
+    await record["press"](interaction, int(index))
+
+
+class _Prompt:
+    __slots__ = ("id", "author_id", "items", "expires", "future")
+
+    def __init__(self, author_id: int, items: Sequence[PredItem], timeout: float) -> None:
+        loop = asyncio.get_running_loop()
+        # random, so presses on messages from before a restart can't match a new prompt
+        self.id = os.urandom(6).hex()
+        self.author_id = author_id
+        self.items = items
+        self.expires = loop.time() + timeout
+        self.future: asyncio.Future = loop.create_future()
+
+    async def press(self, interaction: Interaction, index: int) -> None:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message(
+                "You don't have have permission to do this.", ephemeral=True
+            )
+            return
+        _remove(self.id)
+        if not self.future.done():
+            self.future.set_result(self.items[index].ref)
+        # one request to both acknowledge the press and disable the buttons
+        await interaction.response.edit_message(view=_build_view(self.items, highlight=[index]))
+
+    def expire(self) -> None:
+        if not self.future.done():
+            self.future.set_exception(asyncio.TimeoutError())
+
+    def size(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.id) + sys.getsizeof(self.future)
+
+
+class _Collection:
+    __slots__ = (
+        "id",
+        "items",
+        "expires",
+        "future",
+        "quorum",
+        "users",
+        "allow_change",
+        "tally",
+        "tally_interval",
+        "choices",
+        "message",
+        "last_edit",
+        "edit_handle",
+        "edit_task",
+        "final_sent",
+    )
+
+    def __init__(
+        self,
+        items: Sequence[PredItem],
+        timeout: float,
+        quorum: Optional[int],
+        users: Optional[Container[int]],
+        allow_change: bool,
+        tally: bool,
+        tally_interval: float,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        self.id = os.urandom(6).hex()
+        self.items = items
+        self.expires = loop.time() + timeout
+        self.future: asyncio.Future = loop.create_future()  # result is whether quorum reached
+        self.quorum = quorum
+        self.users = users
+        self.allow_change = allow_change
+        self.tally = tally
+        self.tally_interval = tally_interval
+
+        self.choices: Dict[int, int] = {}  # user ID: item index
+        self.message: Optional[discord.Message] = None
+        self.last_edit = -math.inf  # loop time
+        self.edit_handle: Optional[asyncio.TimerHandle] = None
+        self.edit_task: Optional[asyncio.Task] = None
+        self.final_sent = False
+
+    async def press(self, interaction: Interaction, index: int) -> None:
+        user_id = interaction.user.id
+        if self.users is not None and user_id not in self.users:
+            await interaction.response.send_message(
+                "You don't have have permission to do this.", ephemeral=True
+            )
+            return
+        if user_id in self.choices and not self.allow_change:
+            await interaction.response.send_message(
+                "You've already chosen, and can't change it.", ephemeral=True
+            )
+            return
+        if self.future.done():  # finished, but the final edit hasn't been sent yet
+            await interaction.response.defer()
+            return
+
+        self.choices[user_id] = index
+        if self.quorum is not None and len(self.choices) >= self.quorum:
+            self.future.set_result(True)
+            self.final_sent = True
+            await interaction.response.edit_message(view=self.final_view())
+            return
+        if not self.tally:
+            await interaction.response.defer()
+            return
+
+        # the press is acknowledged with the updated tally if it hasn't been updated recently,
+        # otherwise the update waits and covers every press in between
+        loop = asyncio.get_running_loop()
+        since_edit = loop.time() - self.last_edit
+        if since_edit >= self.tally_interval:
+            self.last_edit = loop.time()
+            await interaction.response.edit_message(view=self.live_view())
+        else:
+            await interaction.response.defer()
+            if self.edit_handle is None:
+                delay = self.tally_interval - since_edit
+                self.edit_handle = loop.call_later(delay, self._send_tally)
+
+    def _send_tally(self) -> None:
+        self.edit_handle = None
+        if not self.future.done() and self.message is not None:
+            self.last_edit = asyncio.get_running_loop().time()
+            self.edit_task = asyncio.create_task(self._edit(self.live_view()))
+
+    async def _edit(self, view: ui.View) -> None:
+        try:
+            await self.message.edit(view=view)
+        except discord.HTTPException:
+            pass  # the next update or the final one will try again
+
+    def expire(self) -> None:
+        if not self.future.done():
+            self.future.set_result(False)
+
+    def finish(self) -> None:
+        if self.edit_handle is not None:
+            self.edit_handle.cancel()
+            self.edit_handle = None
+
+    def counts(self) -> List[int]:
+        counts = [0] * len(self.items)
+        for index in self.choices.values():
+            counts[index] += 1
+        return counts
+
+    def live_view(self) -> ui.View:
+        counts = self.counts() if self.tally else None
+        return _build_view(self.items, prompt_id=self.id, counts=counts)
+
+    def final_view(self) -> ui.View:
+        counts = self.counts()
+        top = max(counts)
+        highlight = [i for i, count in enumerate(counts) if count == top and count]
+        return _build_view(self.items, highlight=highlight, counts=counts if self.tally else None)
+
+    def result(self) -> Collected:
+        return Collected(
+            presses={user_id: self.items[i].ref for user_id, i in self.choices.items()},
+            counts=self.counts(),
+            quorum_reached=self.future.result(),
+        )
+
+    def size(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.id) + sys.getsizeof(self.choices)
+
+
+def _build_view(
+    items: Sequence[PredItem],
+    *,
+    prompt_id: Optional[str] = None,
+    highlight: Container[int] = (),
+    counts: Optional[Sequence[int]] = None,
+) -> ui.View:
+    """Build the buttons for a prompt, or without a prompt ID the disabled ones for once it's
+    finished, where only the buttons at the ``highlight`` indexes keep their colour.
+
+    The view is stopped, so discord.py doesn't store it when it's sent."""
+    view = ui.View(timeout=None)
+    for index, item in enumerate(items):
+        label = item.label if counts is None else f"{item.label} ({counts[index]})"
+        if prompt_id is None:
+            button = ui.Button(
+                style=item.style if index in highlight else ButtonStyle.gray,
+                label=label,
+                row=item.row,
+                disabled=True,
+            )
+        else:
+            button = ui.Button(
+                style=item.style,
+                label=label,
+                row=item.row,
+                custom_id=f"{CUSTOM_ID_PREFIX}:{prompt_id}:{index}",
+            )
+        view.add_item(button)
+    view.stop()
+    return view
+
+
+async def _dispatched_press(
+    ctx: commands.Context,
+    items: Sequence[PredItem],
+    content: Optional[str],
+    embed: Optional[Embed],
+    timeout: float,
+) -> Any:
+    _setup_dispatcher(ctx.bot)
+    prompt = _Prompt(ctx.author.id, items, timeout)
+    _add(prompt)
+    try:
+        await ctx.send(content=content, embed=embed, view=_build_view(items, prompt_id=prompt.id))
+        return await prompt.future
+    finally:
+        _remove(prompt.id)
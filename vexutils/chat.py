@@ -1,26 +1,141 @@
+import dataclasses
 import datetime
+import threading
+from collections import OrderedDict
 from io import StringIO
-from typing import Any, Literal, Sequence, Union
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    Sized,
+    Tuple,
+    Union,
+)
 
 from redbot.core.utils.chat_formatting import box, humanize_list, humanize_number, inline
+from rich.box import Box
 from rich.console import Console
+from rich.style import Style
+from rich.table import Table  # type:ignore
 
 TimestampFormat = Literal["f", "F", "d", "D", "t", "T", "R"]
 
+# making a Console (terminal detection, theme...) costs far more than printing a small table, so
+# one is kept per width. the lock is because Console isn't thread safe and these can be used from
+# executors
+_consoles: Dict[int, Tuple[Console, threading.Lock]] = {}
+_consoles_lock = threading.Lock()
 
-def no_colour_rich_markup(*objects: Any, lang: str = "") -> str:
+RENDER_CACHE_SIZE = 128
+_render_cache: "OrderedDict[Hashable, str]" = OrderedDict()
+_render_cache_lock = threading.Lock()
+
+
+def no_colour_rich_markup(
+    *objects: Any, lang: str = "", width: int = 80, cache: bool = False
+) -> str:
     """
     Slimmed down version of rich_markup which ensure no colours (/ANSI) can exist
     https://github.com/Cog-Creators/Red-DiscordBot/pull/5538/files (Kowlin)
+
+    With ``cache=True``, the output is kept in an LRU cache keyed by the content of the objects,
+    so rendering the same thing again is a lookup. This only works for strings and tables of
+    plain cells, anything else is rendered as normal. The key includes every option of the
+    table and its columns and rows, so only tables that would render the same share an entry.
     """
-    temp_console = Console(  # Prevent messing with STDOUT's console
-        color_system=None,
-        file=StringIO(),
-        force_terminal=True,
-        width=80,
-    )
-    temp_console.print(*objects)
-    return box(temp_console.file.getvalue(), lang=lang)  # type: ignore
+    key = _content_key(objects, width) if cache else None
+    if key is not None:
+        with _render_cache_lock:
+            cached = _render_cache.get(key)
+            if cached is not None:
+                _render_cache.move_to_end(key)
+                return box(cached, lang=lang)
+
+    console, lock = _get_console(width)
+    with lock:
+        console.print(*objects)
+        file: StringIO = console.file  # type: ignore
+        rendered = file.getvalue()
+        file.seek(0)
+        file.truncate()
+
+    if key is not None:
+        with _render_cache_lock:
+            _render_cache[key] = rendered
+            if len(_render_cache) > RENDER_CACHE_SIZE:
+                _render_cache.popitem(last=False)
+
+    return box(rendered, lang=lang)
+
+
+def _get_console(width: int) -> Tuple[Console, threading.Lock]:
+    with _consoles_lock:
+        if width not in _consoles:
+            console = Console(  # Prevent messing with STDOUT's console
+                color_system=None,
+                file=StringIO(),
+                force_terminal=True,
+                width=width,
+            )
+            _consoles[width] = (console, threading.Lock())
+        return _consoles[width]
+
+
+def _content_key(objects: Sequence[Any], width: int) -> Optional[Hashable]:
+    """A key for the content of the objects, or None if they aren't supported."""
+    try:
+        return (width, *(_plain_key(obj) for obj in objects))
+    except _Unsupported:
+        return None
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def _plain_key(value: Any) -> Hashable:
+    """A key from every attribute of a table, its columns and rows, so that anything which
+    changes the output (padding, widths, footers...) changes the key. Raises _Unsupported for
+    anything that isn't plain data, such as a renderable in a cell."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_plain_key(v) for v in value)
+    if isinstance(value, Style):
+        return value  # immutable and hashable
+    if isinstance(value, Box):
+        return ("box", str(value), value.ascii)
+    if isinstance(value, Table):
+        return ("table", *((k, _plain_key(v)) for k, v in sorted(vars(value).items())))
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):  # Column and Row
+        fields = dataclasses.fields(value)
+        return (
+            type(value).__name__,
+            *((f.name, _plain_key(getattr(value, f.name))) for f in fields),
+        )
+    raise _Unsupported
+
+
+# largest first. a unit is used once there are at least 10 of it
+_DECIMAL_UNITS = (
+    ("PB", 1000**5),
+    ("TB", 1000**4),
+    ("GB", 1000**3),
+    ("MB", 1000**2),
+    ("KB", 1000),
+)
+_BINARY_UNITS = (
+    ("PiB", 1024**5),
+    ("TiB", 1024**4),
+    ("GiB", 1024**3),
+    ("MiB", 1024**2),
+    ("KiB", 1024),
+)
 
 
 def _hum(num: Union[int, float], unit: str, ndigits: int) -> str:
@@ -28,22 +143,70 @@ def _hum(num: Union[int, float], unit: str, ndigits: int) -> str:
     return humanize_number(round(num, ndigits)) + f" {unit}"
 
 
-def humanize_bytes(bytes: Union[int, float], ndigits: int = 0) -> str:
-    """Humanize a number of bytes, rounding to ndigits. Only supports up to GB.
+def _hum_many(nums: Sequence[Union[int, float]], units: Sequence[str], ndigits: int) -> List[str]:
+    """Round then humanize each number, with its unit. Bytes are never rounded."""
+    return [_hum(num, unit, 0 if unit == "B" else ndigits) for num, unit in zip(nums, units)]
 
-    This assumes 1GB = 1000MB, 1MB = 1000KB, 1KB = 1000B"""
-    if bytes > 10000000000:  # 10GB
-        gb = bytes / 1000000000
-        return _hum(gb, "GB", ndigits)
-    if bytes > 10000000:  # 10MB
-        mb = bytes / 1000000
-        return _hum(mb, "MB", ndigits)
-    if bytes > 10000:  # 10KB
-        kb = bytes / 1000
-        return _hum(kb, "KB", ndigits)
+
+def humanize_bytes(bytes: Union[int, float], ndigits: int = 0, *, binary: bool = False) -> str:
+    """Humanize a number of bytes, rounding to ndigits. Supports up to PB.
+
+    This assumes 1GB = 1000MB, 1MB = 1000KB, 1KB = 1000B. With ``binary=True``, it uses
+    1GiB = 1024MiB etc instead."""
+    for unit, size in _BINARY_UNITS if binary else _DECIMAL_UNITS:
+        if bytes > size * 10:
+            return _hum(bytes / size, unit, ndigits)
     return _hum(bytes, "B", 0)  # no point in rounding
 
 
+def humanize_bytes_many(
+    values: Iterable[Union[int, float]], ndigits: int = 0, *, binary: bool = False
+) -> List[str]:
+    """Humanize many numbers of bytes at once. The output is the same as calling
+    `humanize_bytes` on each one.
+
+    Picking the unit and dividing is done in one go with NumPy, if it's installed. The values
+    can be any sequence, or a NumPy array or pandas Series.
+
+    Parameters
+    ----------
+    values : Iterable[Union[int, float]]
+        The numbers of bytes
+    ndigits : int, optional
+        Digits to round to, by default 0
+    binary : bool, optional
+        Whether to use KiB, MiB etc rather than KB, MB etc, by default False
+
+    Returns
+    -------
+    List[str]
+        The humanized values, in the same order
+    """
+    try:
+        import numpy
+    except ImportError:
+        return [humanize_bytes(v, ndigits, binary=binary) for v in values]
+
+    units = _BINARY_UNITS if binary else _DECIMAL_UNITS
+    if not isinstance(values, Sized):
+        values = list(values)
+    array = numpy.asarray(values)
+    if array.size == 0:
+        return []
+    # bytes aren't divided, so use the originals (eg ints stay ints, like with humanize_bytes)
+    originals = values if isinstance(values, (list, tuple)) else array.tolist()
+
+    names = numpy.array([unit for unit, _ in units] + ["B"])
+    sizes = numpy.array([size for _, size in units] + [1])
+    # first match wins, same as the loop in humanize_bytes
+    chosen = numpy.select([array > size * 10 for _, size in units], range(len(units)), len(units))
+
+    chosen_names = names[chosen].tolist()
+    scaled = (array / sizes[chosen]).tolist()
+    nums = [o if unit == "B" else num for o, num, unit in zip(originals, scaled, chosen_names)]
+    return _hum_many(nums, chosen_names, ndigits)
+
+
 # maybe think about adding to core
 def inline_hum_list(items: Sequence[str], *, style: str = "standard") -> str:
     """Similar to core's humanize_list, but all items are in inline code blocks. **Can** be used
@@ -0,0 +1,256 @@
+import asyncio
+import concurrent.futures
+import functools
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, Literal, Optional, TypeVar
+
+from .shared import get_shared
+
+# shared, bounded executors for running CPU heavy work (pandas, plotting) off the event loop, so
+# it doesn't block the gateway heartbeat. every cog shares the same pools, and each cog has a
+# limit on how many of its jobs can run at once so one cog can't take all the workers
+
+ExecutorMode = Literal["thread", "process"]
+
+T = TypeVar("T")
+
+MAX_THREADS = min(8, (os.cpu_count() or 1) + 2)
+MAX_PROCESSES = max(1, min(4, (os.cpu_count() or 1) - 1))
+DEFAULT_COG_LIMIT = 2
+
+# mode: executor. created on first use
+_executors: Dict[str, concurrent.futures.Executor] = get_shared("executors_v1", dict)
+# cog name: state dict. plain dicts as other cogs might have a different version of this file
+_cogs: Dict[str, Dict[str, Any]] = get_shared("executor_cogs_v1", dict)
+
+
+def _get_executor(mode: ExecutorMode) -> concurrent.futures.Executor:
+    if mode not in _executors:
+        if mode == "thread":
+            _executors[mode] = concurrent.futures.ThreadPoolExecutor(MAX_THREADS, "vex_offload")
+        elif mode == "process":
+            _executors[mode] = concurrent.futures.ProcessPoolExecutor(MAX_PROCESSES)
+        else:
+            raise ValueError(f"Unknown executor mode {mode}.")
+    return _executors[mode]
+
+
+def _get_cog(cog_name: str) -> Dict[str, Any]:
+    if cog_name not in _cogs:
+        _cogs[cog_name] = {
+            "semaphore": asyncio.Semaphore(DEFAULT_COG_LIMIT),
+            "limit": DEFAULT_COG_LIMIT,
+            # slots to take out of the semaphore when jobs finish, after the limit was lowered
+            "excess": 0,
+            "closed": False,
+            "futures": set(),
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "queued": 0,
+            "running": 0,
+            "queue_time_total": 0.0,
+            "run_time_total": 0.0,
+            "run_time_max": 0.0,
+        }
+    return _cogs[cog_name]
+
+
+def set_cog_limit(cog_name: str, limit: int) -> None:
+    """Set how many jobs from a cog can run at once, by default 2.
+
+    This can be changed while jobs are running. If the limit is lowered, running jobs carry on
+    and no more start until the cog is under the new limit.
+    """
+    if limit < 1:
+        raise ValueError("The limit must be at least 1.")
+    state = _get_cog(cog_name)
+    # the semaphore is resized rather than replaced, as running jobs release the one they hold
+    change = limit - state["limit"]
+    state["limit"] = limit
+    if change < 0:
+        state["excess"] -= change
+        return
+    cancelled = min(change, state["excess"])
+    state["excess"] -= cancelled
+    for _ in range(change - cancelled):
+        state["semaphore"].release()
+
+
+async def _acquire(state: Dict[str, Any]) -> None:
+    await state["semaphore"].acquire()
+    while state["excess"]:  # the limit was lowered, so this slot no longer exists
+        state["excess"] -= 1
+        await state["semaphore"].acquire()
+
+
+def _release(state: Dict[str, Any]) -> None:
+    if state["excess"]:
+        state["excess"] -= 1
+    else:
+        state["semaphore"].release()
+
+
+async def run_off_loop(
+    cog_name: str,
+    func: Callable[..., T],
+    *args: Any,
+    mode: ExecutorMode = "thread",
+    **kwargs: Any,
+) -> T:
+    """Run a function in a shared executor, waiting if the cog is at its limit.
+
+    Cancelling this doesn't stop the function once it's started, as threads can't be stopped,
+    so it still counts towards the limit until it finishes.
+
+    Parameters
+    ----------
+    cog_name : str
+        The cog this is for, used for the limit and stats
+    func : Callable[..., T]
+        The function. In process mode it and its arguments must be picklable, so it has to be
+        defined at module level
+    *args, **kwargs
+        Passed to the function
+    mode : Literal["thread", "process"], optional
+        Which pool to use, by default "thread". Threads are fine for pandas and NumPy as they
+        release the GIL for most work, processes are for pure Python number crunching
+
+    Returns
+    -------
+    T
+        What the function returned
+
+    Raises
+    ------
+    RuntimeError
+        `shutdown_cog` has been called for this cog
+    """
+    state = _get_cog(cog_name)
+    if state["closed"]:
+        raise RuntimeError(f"The executor for {cog_name} has been shut down.")
+    executor = _get_executor(mode)
+    loop = asyncio.get_running_loop()
+
+    state["submitted"] += 1
+    state["queued"] += 1
+    queued_at = time.monotonic()
+    try:
+        await _acquire(state)
+    finally:
+        state["queued"] -= 1
+    if state["closed"]:
+        _release(state)
+        raise RuntimeError(f"The executor for {cog_name} has been shut down.")
+    state["running"] += 1
+    started = time.monotonic()
+    state["queue_time_total"] += started - queued_at
+
+    future = loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    state["futures"].add(future)
+    # the thread or process carries on if the caller is cancelled, so the slot is only given
+    # back when the job has actually finished
+    future.add_done_callback(functools.partial(_job_done, state, started))
+    return await asyncio.shield(future)
+
+
+def _job_done(state: Dict[str, Any], started: float, future: asyncio.Future) -> None:
+    state["futures"].discard(future)
+    state["running"] -= 1
+    run_time = time.monotonic() - started
+    state["run_time_total"] += run_time
+    state["run_time_max"] = max(state["run_time_max"], run_time)
+    # this also retrieves the exception, so it's not logged if the caller was cancelled
+    if future.cancelled() or future.exception() is not None:
+        state["failed"] += 1
+    else:
+        state["completed"] += 1
+    _release(state)
+
+
+def offload(
+    cog_name: str, *, mode: ExecutorMode = "thread"
+) -> Callable[[Callable[..., T]], Callable[..., Awaitable[T]]]:
+    """Decorator to make a function always run with `run_off_loop`. It becomes a coroutine
+    function with the same arguments.
+
+    Example
+    -------
+    ```py
+    @offload("StatTrack")
+    def make_plot(df):
+        ...
+
+    fig = await make_plot(df)
+    ```
+
+    In process mode the function must be defined at module level.
+    """
+
+    def decorator(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            return await run_off_loop(cog_name, func, *args, mode=mode, **kwargs)
+
+        if mode == "process":
+            # functions are pickled as their module and name, which is now the wrapper, so the
+            # original is kept under another name for the worker process to find
+            if "." in func.__qualname__:  # methods and nested functions can't be found at all
+                raise ValueError("Functions offloaded to processes must be at module level.")
+            func.__qualname__ = f"_offloaded_{func.__qualname__}"
+            setattr(sys.modules[func.__module__], func.__qualname__, func)
+
+        return wrapper
+
+    return decorator
+
+
+def offload_stats(cog_name: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Get stats on offloaded jobs, for one cog or every cog.
+
+    Times are in seconds. ``queued`` and ``running`` are right now, and the rest are since the
+    cog first offloaded something.
+
+    Returns
+    -------
+    Dict[str, Dict[str, Any]]
+        Cog name: stats
+    """
+    names = list(_cogs) if cog_name is None else [cog_name]
+    stats = {}
+    for name in names:
+        state = _cogs.get(name)
+        if state is None:
+            continue
+        done = state["completed"] + state["failed"]
+        started = done + state["running"]
+        stats[name] = {
+            "limit": state["limit"],
+            "submitted": state["submitted"],
+            "completed": state["completed"],
+            "failed": state["failed"],
+            "queued": state["queued"],
+            "running": state["running"],
+            "queue_time_avg": state["queue_time_total"] / started if started else 0.0,
+            "run_time_avg": state["run_time_total"] / done if done else 0.0,
+            "run_time_max": state["run_time_max"],
+        }
+    return stats
+
+
+async def shutdown_cog(cog_name: str) -> None:
+    """Stop accepting jobs from a cog and wait for its running ones to finish. Call this on
+    cog unload.
+
+    Jobs still waiting for the cog's limit raise RuntimeError. The shared pools keep running
+    for other cogs. The cog can use this again after being loaded again.
+    """
+    state = _cogs.get(cog_name)
+    if state is None:
+        return
+    state["closed"] = True
+    if state["futures"]:
+        await asyncio.gather(*state["futures"], return_exceptions=True)
+    del _cogs[cog_name]
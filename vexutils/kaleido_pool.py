@@ -0,0 +1,291 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .shared import get_shared
+
+# starting Kaleido's Chromium takes a few seconds and a couple hundred MB, so rather than every
+# render starting its own this keeps a few warm ones, shared by all cogs. each browser is
+# replaced after a number of renders as Chromium's memory use creeps up, and closed once it's
+# been idle for a while. rendered PNGs are cached by a hash of the figure's JSON, so the same
+# graph requested again isn't rendered again
+
+log = logging.getLogger("red.vex-utils")
+
+# the pool's state is a plain dict, shared so there's one pool for the whole bot whichever cog
+# creates it. each cog's copy of the utils wraps it in its own KaleidoPool, so no copy calls code
+# from another (which might be an older version, or from before a reload). the key's version
+# changes if the dict's layout does
+_state: Dict[str, Any] = get_shared("kaleido_pool_v3", dict)
+
+
+class KaleidoPool:
+    """A pool of warm Kaleido browsers, with a cache of rendered images."""
+
+    def __init__(
+        self,
+        size: int = 2,
+        timeout: float = 30.0,
+        max_renders: int = 100,
+        idle_timeout: float = 600.0,
+        cache_size: int = 64,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        size : int, optional
+            Maximum number of browsers, which is also how many renders can run at once, by
+            default 2
+        timeout : float, optional
+            Seconds a render can take before being cancelled, by default 30.0. The browser is
+            then replaced, in case it's stuck
+        max_renders : int, optional
+            Renders before a browser is replaced to free its memory, by default 100
+        idle_timeout : float, optional
+            Seconds a browser can be unused before it's closed, by default 600.0
+        cache_size : int, optional
+            Number of rendered images to keep, by default 64. 0 disables the cache
+        """
+        self._data: Dict[str, Any] = {
+            "size": size,
+            "timeout": timeout,
+            "max_renders": max_renders,
+            "idle_timeout": idle_timeout,
+            "cache_size": cache_size,
+            "semaphore": asyncio.Semaphore(size),
+            # renderers are dicts of kaleido, renders and last_used. most recently used last
+            "idle": [],
+            "open": 0,
+            "idle_handle": None,
+            "closing": set(),  # tasks closing idle browsers, kept so they aren't garbage collected
+            "cache": OrderedDict(),
+            "inflight": {},
+            "closed": False,
+            "render_count": 0,
+            "hit_count": 0,
+            "timeout_count": 0,
+            "recycle_count": 0,
+        }
+
+    @classmethod
+    def _wrap(cls, data: Dict[str, Any]) -> "KaleidoPool":
+        pool = cls.__new__(cls)
+        pool._data = data
+        return pool
+
+    async def render(self, fig: Any, opts: Optional[dict] = None) -> bytes:
+        """Render a figure to an image, or get it from the cache.
+
+        Parameters
+        ----------
+        fig : Any
+            A plotly figure, or its dict
+        opts : Optional[dict], optional
+            Passed to Kaleido, for example ``{"format": "png", "width": 700}``
+
+        Returns
+        -------
+        bytes
+            The image
+
+        Raises
+        ------
+        ImportError
+            Kaleido is not installed
+        asyncio.TimeoutError
+            The render took longer than the timeout
+        RuntimeError
+            The pool has been closed
+        """
+        data = self._data
+        if data["closed"]:
+            raise RuntimeError("The Kaleido pool has been closed.")
+        key = _figure_key(fig, opts) if data["cache_size"] else None
+        if key is None:
+            return await _render(data, fig, opts)
+
+        cache: "OrderedDict[str, bytes]" = data["cache"]
+        if key in cache:
+            cache.move_to_end(key)
+            data["hit_count"] += 1
+            return cache[key]
+        # the same figure is already being rendered, eg a graph command used twice at once
+        task = data["inflight"].get(key)
+        if task is not None:
+            data["hit_count"] += 1
+        else:
+            # a task of its own, so if the caller that started it is cancelled others still get
+            # the image
+            task = asyncio.ensure_future(_render_and_cache(data, key, fig, opts))
+            # so an error isn't logged as never retrieved if every caller was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            data["inflight"][key] = task
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get stats on the pool. ``open`` is browsers running now, ``busy`` is those
+        rendering, and ``cache_bytes`` is the size of the cached images."""
+        data = self._data
+        return {
+            "open": data["open"],
+            "busy": data["open"] - len(data["idle"]),
+            "renders": data["render_count"],
+            "cache_hits": data["hit_count"],
+            "timeouts": data["timeout_count"],
+            "recycled": data["recycle_count"],
+            "cached": len(data["cache"]),
+            "cache_bytes": sum(len(image) for image in data["cache"].values()),
+        }
+
+    def clear_cache(self) -> None:
+        """Remove all cached images."""
+        self._data["cache"].clear()
+
+    async def close(self) -> None:
+        """Close the idle browsers. Busy ones are closed when their render finishes."""
+        data = self._data
+        data["closed"] = True
+        if data["idle_handle"] is not None:
+            data["idle_handle"].cancel()
+            data["idle_handle"] = None
+        idle, data["idle"] = data["idle"], []
+        await asyncio.gather(*(_close_renderer(data, r) for r in idle), *data["closing"])
+        data["cache"].clear()
+
+
+async def _render_and_cache(
+    data: Dict[str, Any], key: str, fig: Any, opts: Optional[dict]
+) -> bytes:
+    try:
+        image = await _render(data, fig, opts)
+    finally:
+        del data["inflight"][key]
+    cache: "OrderedDict[str, bytes]" = data["cache"]
+    cache[key] = image
+    while len(cache) > data["cache_size"]:
+        cache.popitem(last=False)
+    return image
+
+
+async def _render(data: Dict[str, Any], fig: Any, opts: Optional[dict]) -> bytes:
+    async with data["semaphore"]:
+        renderer = data["idle"].pop() if data["idle"] else await _start_renderer(data)
+        try:
+            image = await asyncio.wait_for(
+                renderer["kaleido"].calc_fig(fig, opts), timeout=data["timeout"]
+            )
+        except BaseException as e:
+            # the browser might be stuck or broken, so don't reuse it
+            if isinstance(e, asyncio.TimeoutError):
+                data["timeout_count"] += 1
+            await _close_renderer(data, renderer)
+            raise
+
+        data["render_count"] += 1
+        renderer["renders"] += 1
+        renderer["last_used"] = time.monotonic()
+        if renderer["renders"] >= data["max_renders"] or data["closed"]:
+            data["recycle_count"] += 1
+            await _close_renderer(data, renderer)
+        else:
+            data["idle"].append(renderer)
+            _schedule_idle_check(data)
+        return image
+
+
+async def _start_renderer(data: Dict[str, Any]) -> Dict[str, Any]:
+    import kaleido
+
+    from .kaleido_setup import kaleido_setup, kaleido_status
+
+    # only renders wait for Chromium to be downloaded, not cog load
+    if not await kaleido_setup(wait=True):
+        error = kaleido_status()["error"]
+        raise RuntimeError(f"Kaleido's rendering engine isn't available: {error}")
+
+    start = time.monotonic()
+    # timeouts are done here, so the browser can be replaced when one happens
+    browser = kaleido.Kaleido(n=1, timeout=None, path=kaleido_status()["path"])
+    await browser.open()
+    data["open"] += 1
+    log.debug("Started a Kaleido browser in %.2fs", time.monotonic() - start)
+    return {"kaleido": browser, "renders": 0, "last_used": time.monotonic()}
+
+
+async def _close_renderer(data: Dict[str, Any], renderer: Dict[str, Any]) -> None:
+    data["open"] -= 1
+    try:
+        await renderer["kaleido"].close()
+    except Exception:
+        log.warning("Error closing a Kaleido browser", exc_info=True)
+
+
+def _schedule_idle_check(data: Dict[str, Any]) -> None:
+    if data["idle_handle"] is None:
+        loop = asyncio.get_running_loop()
+        data["idle_handle"] = loop.call_later(data["idle_timeout"], _close_idle, data)
+
+
+def _close_idle(data: Dict[str, Any]) -> None:
+    data["idle_handle"] = None
+    cutoff = time.monotonic() - data["idle_timeout"]
+    idle = [r for r in data["idle"] if r["last_used"] <= cutoff]
+    data["idle"] = [r for r in data["idle"] if r["last_used"] > cutoff]
+    for renderer in idle:
+        task = asyncio.create_task(_close_renderer(data, renderer))
+        data["closing"].add(task)
+        task.add_done_callback(data["closing"].discard)
+    if data["idle"]:
+        _schedule_idle_check(data)
+
+
+def get_kaleido_pool(**kwargs: Any) -> KaleidoPool:
+    """Get the shared Kaleido pool, creating it if no cog has yet.
+
+    Keyword arguments are passed to `KaleidoPool`, and are ignored if it already exists.
+
+    Example
+    -------
+    ```py
+    png = await get_kaleido_pool().render(fig, {"format": "png", "width": 900})
+    file = discord.File(io.BytesIO(png), "graph.png")
+    ```
+    """
+    data = _state.get("pool")
+    if data is not None and not data["closed"]:
+        return KaleidoPool._wrap(data)
+    pool = KaleidoPool(**kwargs)
+    _state["pool"] = pool._data
+    return pool
+
+
+async def close_kaleido_pool() -> None:
+    """Close the shared Kaleido pool, if it exists. The next `get_kaleido_pool` makes a new one.
+
+    As other cogs might be using the pool, there's no need to call this on cog unload, unused
+    browsers close themselves after the idle timeout.
+    """
+    data = _state.pop("pool", None)
+    if data is not None:
+        await KaleidoPool._wrap(data).close()
+
+
+def _figure_key(fig: Any, opts: Optional[dict]) -> Optional[str]:
+    """Hash of the figure and options, or None if it can't be serialised to JSON."""
+    try:
+        if hasattr(fig, "to_json"):
+            fig_json = fig.to_json()
+        else:
+            try:
+                from plotly.utils import PlotlyJSONEncoder  # handles numpy arrays etc
+            except ImportError:
+                PlotlyJSONEncoder = None  # type: ignore
+            fig_json = json.dumps(fig, sort_keys=True, cls=PlotlyJSONEncoder)
+        opts_json = json.dumps(opts or {}, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(f"{fig_json}\0{opts_json}".encode()).hexdigest()
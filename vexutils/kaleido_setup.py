@@ -1,33 +1,189 @@
-try:
-    import kaleido
-    from choreographer.browsers.chromium import ChromeNotFoundError
+import asyncio
+import importlib.metadata
+import json
+import logging
+import os
+import subprocess
+import time
+from typing import Any, Dict, Optional
 
-    import logging
+from .shared import get_shared, utils_data_path
 
-    log = logging.getLogger("red.vex-utils")
+log = logging.getLogger("red.vex-utils")
 
-    async def kaleido_setup() -> bool:
-        """
-        Install Kaleido's rendering engine (Chromium) if it's not already installed.
-        """
-        try:
-            kaleido.Kaleido()
-            log.info("Kaleido rendering engine (Chromium) found")
-        except ChromeNotFoundError:
-            log.info("Kaleido rendering engine (Chromium) not found, downloading now")
-            location = await kaleido.get_chrome()
-            log.info("Kaleido rendering engine backend is ready to use, at %s", location)
-        except AttributeError:
+# kaleido and choreographer are only imported when this is called, they're slow to import
+
+# finding Chromium (and downloading it if it's not there) can take a while, so it's done in a
+# background task that chart commands wait for, rather than holding up cog load. the path that's
+# found is cached on disk so after the first time it's just checked it still exists
+
+CACHE_FILE = "kaleido_chrome.json"
+PROGRESS_INTERVAL = 15.0  # seconds between "still downloading" logs
+
+# shared, so only one cog looks for or downloads Chromium
+_state: Dict[str, Any] = get_shared("kaleido_setup_v1", lambda: {"status": "not started"})
+
+
+async def kaleido_setup(*, wait: bool = False) -> bool:
+    """
+    Install Kaleido's rendering engine (Chromium) if it's not already installed.
+
+    This returns straight away, finding or downloading Chromium in the background. Use
+    `wait_for_kaleido` before rendering, or `kaleido_status` to check on it.
+
+    Parameters
+    ----------
+    wait : bool, optional
+        Wait for Chromium to be found or downloaded, by default False
+
+    Returns
+    -------
+    bool
+        Whether Chromium is ready to use (so when not waiting, False if it isn't known yet)
+    """
+    try:
+        import kaleido
+    except ImportError:
+        raise ImportError("Kaleido is not installed so this util is not required.")
+
+    if _state["status"] == "ready":
+        return True
+    cached = _load_cache(_kaleido_version(kaleido))
+    if cached is not None:
+        _state.update(status="ready", error=None, **cached)
+        return True
+
+    task: Optional[asyncio.Task] = _state.get("task")
+    if task is None or task.done():  # not started, or failed so try again
+        _state["status"] = "checking"
+        _state["task"] = task = asyncio.create_task(_setup())
+    if wait:
+        await asyncio.shield(task)
+    return _state["status"] == "ready"
+
+
+async def wait_for_kaleido(timeout: Optional[float] = None) -> bool:
+    """Start the setup if it hasn't been, and wait for it to finish.
+
+    Parameters
+    ----------
+    timeout : Optional[float], optional
+        Seconds to wait, by default no limit. The setup carries on in the background if this
+        times out
+
+    Returns
+    -------
+    bool
+        Whether Chromium is ready to use
+
+    Raises
+    ------
+    asyncio.TimeoutError
+        The timeout was reached
+    """
+    return await asyncio.wait_for(kaleido_setup(wait=True), timeout)
+
+
+def kaleido_status() -> Dict[str, Any]:
+    """Get the state of the setup, for polling.
+
+    ``status`` is one of "not started", "checking", "downloading", "ready" or "failed". Once
+    ready, ``path`` and ``version`` are Chromium's (version can be None if it's not known),
+    and if failed ``error`` is why.
+    """
+    return {
+        "status": _state["status"],
+        "path": _state.get("path"),
+        "version": _state.get("version"),
+        "error": _state.get("error"),
+    }
+
+
+async def _setup() -> None:
+    import kaleido
+
+    loop = asyncio.get_running_loop()
+    try:
+        if not hasattr(kaleido, "get_chrome"):
             log.error(
                 "An old version of Kaleido is installed, it should already have been updated, "
                 "please restart your bot to ensure the latest version is used. If this doesn't "
                 "work, please contact Vexed for support in the cog support server "
                 "https://discord.gg/GD43Nb9H86"
             )
-            return False
-        return True
+            _state.update(status="failed", error="Kaleido is out of date.")
+            return
 
-except ImportError:
+        path = await loop.run_in_executor(None, _find_chrome)
+        if path:
+            log.info("Kaleido rendering engine (Chromium) found")
+        else:
+            log.info("Kaleido rendering engine (Chromium) not found, downloading now")
+            _state["status"] = "downloading"
+            path = str(await _download(kaleido))
+            log.info("Kaleido rendering engine backend is ready to use, at %s", path)
 
-    def kaleido_setup() -> None:
-        raise ImportError("Kaleido is not installed so this util is not required.")
+        version = await loop.run_in_executor(None, _chrome_version, path)
+        cache = {"path": path, "version": version, "kaleido": _kaleido_version(kaleido)}
+        await loop.run_in_executor(None, _save_cache, cache)
+        _state.update(status="ready", path=path, version=version, error=None)
+    except Exception as e:
+        log.exception("Unable to set up Kaleido's rendering engine (Chromium)")
+        _state.update(status="failed", error=str(e) or type(e).__name__)
+
+
+async def _download(kaleido: Any) -> Any:
+    download = asyncio.ensure_future(kaleido.get_chrome())
+    start = time.monotonic()
+    while True:
+        done, _ = await asyncio.wait({download}, timeout=PROGRESS_INTERVAL)
+        if done:
+            return download.result()
+        log.info(
+            "Still downloading Kaleido's rendering engine (Chromium), %ds so far",
+            time.monotonic() - start,
+        )
+
+
+def _find_chrome() -> Optional[str]:
+    from choreographer.browsers.chromium import Chromium
+
+    return Chromium.find_browser(skip_local=False)
+
+
+def _chrome_version(path: str) -> Optional[str]:
+    try:
+        result = subprocess.run(
+            [path, "--version"], capture_output=True, text=True, timeout=10, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def _kaleido_version(kaleido: Any) -> str:
+    try:
+        return importlib.metadata.version("kaleido")
+    except importlib.metadata.PackageNotFoundError:
+        return str(getattr(kaleido, "__version__", ""))
+
+
+def _load_cache(kaleido_version: str) -> Optional[Dict[str, Any]]:
+    """The cached path and version, if Chromium is still there and Kaleido hasn't changed."""
+    try:
+        with open(utils_data_path() / CACHE_FILE) as fp:
+            cache = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    path = cache.get("path")
+    if cache.get("kaleido") != kaleido_version or not path or not os.access(path, os.X_OK):
+        return None
+    return {"path": path, "version": cache.get("version")}
+
+
+def _save_cache(cache: Dict[str, Any]) -> None:
+    try:
+        with open(utils_data_path() / CACHE_FILE, "w") as fp:
+            json.dump(cache, fp)
+    except OSError:
+        log.warning("Unable to save where Kaleido's rendering engine is", exc_info=True)
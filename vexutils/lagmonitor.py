@@ -0,0 +1,190 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from .loop import _percentile
+from .shared import get_shared
+
+# measures how late the event loop runs a callback scheduled with call_later. if a VexLoop is
+# late and this is too, something else (probably another cog) is blocking the whole event loop
+
+# the state is a plain dict, shared so there's one monitor for the whole bot whichever cog starts
+# it. each cog's copy of the utils wraps it in its own LagMonitor, so no copy calls code from
+# another (which might be an older version, or from before a reload). the key's version changes
+# if the dict's layout does
+_state: Dict[str, Any] = get_shared("lag_monitor_v2", dict)
+
+
+class LagMonitor:
+    """Sample the event loop's scheduling lag.
+
+    Optionally, a watchdog thread captures the event loop thread's stack when it's been blocked
+    for longer than the threshold, showing what was blocking it.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.5,
+        window: int = 600,
+        threshold: float = 0.25,
+        capture_stacks: bool = False,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        interval : float, optional
+            Seconds between probes, by default 0.5
+        window : int, optional
+            Number of recent samples to keep, by default 600 (5 minutes at the default interval)
+        threshold : float, optional
+            Lag in seconds that counts as the event loop being blocked, by default 0.25
+        capture_stacks : bool, optional
+            Whether to capture the stack of whatever is blocking the loop, by default False.
+            This runs a thread that wakes up a few times per threshold
+        """
+        self._data: Dict[str, Any] = {
+            "interval": interval,
+            "threshold": threshold,
+            "capture_stacks": capture_stacks,
+            "lags": deque(maxlen=window),
+            "blocked_count": 0,  # probes with lag above the threshold
+            # (unix time, seconds blocked so far when captured, formatted stack)
+            "stacks": deque(maxlen=5),
+            "loop": None,
+            "handle": None,
+            "expected": 0.0,
+            "heartbeat": 0.0,
+            "loop_thread_id": None,
+            "stop": threading.Event(),
+        }
+
+    @classmethod
+    def _wrap(cls, data: Dict[str, Any]) -> "LagMonitor":
+        monitor = cls.__new__(cls)
+        monitor._data = data
+        return monitor
+
+    @property
+    def interval(self) -> float:
+        return self._data["interval"]
+
+    @property
+    def threshold(self) -> float:
+        return self._data["threshold"]
+
+    @property
+    def capture_stacks(self) -> bool:
+        return self._data["capture_stacks"]
+
+    @property
+    def lags(self) -> Deque[float]:
+        return self._data["lags"]
+
+    @property
+    def blocked_count(self) -> int:
+        return self._data["blocked_count"]
+
+    @property
+    def stacks(self) -> Deque[Tuple[float, float, str]]:
+        return self._data["stacks"]
+
+    @property
+    def running(self) -> bool:
+        return self._data["handle"] is not None
+
+    def start(self) -> None:
+        """Start probing the running event loop."""
+        if self.running:
+            return
+        data = self._data
+        data["loop"] = asyncio.get_running_loop()
+        data["loop_thread_id"] = threading.get_ident()
+        data["heartbeat"] = time.monotonic()
+        _schedule(data)
+
+        if data["capture_stacks"]:
+            data["stop"].clear()
+            threading.Thread(
+                target=_watch, args=(data,), name="vex_lag_watchdog", daemon=True
+            ).start()
+
+    def stop(self) -> None:
+        """Stop probing. The samples are kept."""
+        data = self._data
+        if data["handle"] is not None:
+            data["handle"].cancel()
+            data["handle"] = None
+        data["stop"].set()
+
+    def stats(self) -> Dict[str, float]:
+        """Percentiles of the recent lag samples in seconds, plus ``blocked``, the number of
+        probes over the threshold since starting. Percentiles are 0.0 until there's data."""
+        ordered = sorted(self.lags)
+        return {
+            "p50": _percentile(ordered, 50),
+            "p95": _percentile(ordered, 95),
+            "p99": _percentile(ordered, 99),
+            "max": ordered[-1] if ordered else 0.0,
+            "blocked": self.blocked_count,
+        }
+
+
+def _schedule(data: Dict[str, Any]) -> None:
+    loop: asyncio.AbstractEventLoop = data["loop"]
+    data["expected"] = loop.time() + data["interval"]
+    data["handle"] = loop.call_later(data["interval"], _probe, data)
+
+
+def _probe(data: Dict[str, Any]) -> None:
+    lag = max(data["loop"].time() - data["expected"], 0.0)
+    data["lags"].append(lag)
+    if lag > data["threshold"]:
+        data["blocked_count"] += 1
+    data["heartbeat"] = time.monotonic()
+    _schedule(data)
+
+
+def _watch(data: Dict[str, Any]) -> None:
+    captured_for = 0.0  # heartbeat of the block already captured, so each is only done once
+    while not data["stop"].wait(data["threshold"] / 4):
+        heartbeat = data["heartbeat"]
+        blocked = time.monotonic() - heartbeat - data["interval"]
+        if blocked <= data["threshold"] or heartbeat == captured_for:
+            continue
+        frame = sys._current_frames().get(data["loop_thread_id"])  # type: ignore
+        if frame is None:
+            continue
+        stack = "".join(traceback.format_stack(frame))
+        data["stacks"].append((time.time(), blocked, stack))
+        captured_for = heartbeat
+
+
+def start_lag_monitor(**kwargs: Any) -> LagMonitor:
+    """Start the shared lag monitor, or get it if a cog has already started it.
+
+    Keyword arguments are passed to `LagMonitor`, and are ignored if it's already running.
+    """
+    data = _state.get("monitor")
+    if data is not None and data["handle"] is not None:
+        return LagMonitor._wrap(data)
+    monitor = LagMonitor(**kwargs)
+    monitor.start()
+    _state["monitor"] = monitor._data
+    return monitor
+
+
+def stop_lag_monitor() -> None:
+    """Stop the shared lag monitor, if it's running."""
+    data = _state.pop("monitor", None)
+    if data is not None:
+        LagMonitor._wrap(data).stop()
+
+
+def current_lag_monitor() -> Optional[LagMonitor]:
+    """Get the shared lag monitor, if one has been started."""
+    data = _state.get("monitor")
+    return None if data is None else LagMonitor._wrap(data)
@@ -1,7 +1,11 @@
 import asyncio
 import datetime
+import math
+import time
 import traceback
-from typing import Optional
+import weakref
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Literal, Optional, Sequence
 
 import discord
 from redbot.core.utils.chat_formatting import box, pagify
@@ -9,6 +13,14 @@ from rich.table import Table  # type:ignore
 
 from .chat import no_colour_rich_markup
 from .consts import CHECK, CROSS
+from .shared import get_shared
+
+MissedPolicy = Literal["skip", "catch_up"]
+
+TIMING_SAMPLES = 256  # per loop, older timings are dropped
+
+# every VexLoop from every cog, for metrics. weak so unloaded cogs' loops just disappear
+loop_registry: "weakref.WeakSet[VexLoop]" = get_shared("loop_registry_v1", weakref.WeakSet)
 
 
 class VexLoop:
@@ -20,17 +32,31 @@ class VexLoop:
     This does not log anything itself.
     """
 
-    def __init__(self, friendly_name: str, expected_interval: float) -> None:
+    def __init__(
+        self, friendly_name: str, expected_interval: float, cog_name: Optional[str] = None
+    ) -> None:
         self.friendly_name = friendly_name
         self.expected_interval = datetime.timedelta(seconds=expected_interval)
+        self.cog_name = cog_name  # only used to label metrics
 
         self.iter_count: int = 0
+        self.error_count: int = 0
         self.currently_running: bool = False  # whether the loop is running or sleeping
         self.last_exc: str = "No exception has occurred yet."
         self.last_exc_raw: Optional[BaseException] = None
 
         self.last_iter: Optional[datetime.datetime] = None
         self.next_iter: Optional[datetime.datetime] = None
+        # only set when using run, and then used instead of next_iter so clock changes don't matter
+        self._next_monotonic: Optional[float] = None
+
+        # seconds. lag is how late an iteration started compared to when it was expected
+        self.durations: Deque[float] = deque(maxlen=TIMING_SAMPLES)
+        self.lags: Deque[float] = deque(maxlen=TIMING_SAMPLES)
+        self.overrun_count: int = 0  # iterations that took longer than expected_interval
+        self._start_monotonic: Optional[float] = None
+
+        loop_registry.add(self)
 
     def __repr__(self) -> str:
         return (
@@ -44,6 +70,8 @@ class VexLoop:
         """
         If the loop is running on time (whether or not next expected iteration is in the future)
         """
+        if self._next_monotonic is not None:
+            return self._next_monotonic > time.monotonic()
         if self.next_iter is None:  # not started yet
             return False
         return self.next_iter > datetime.datetime.utcnow()
@@ -56,10 +84,12 @@ class VexLoop:
 
         If the expected time of the next iteration is in the past, this will return `0.0`
         """
-        if self.next_iter is None:  # not started yet
+        if self._next_monotonic is not None:
+            raw_until_next = self._next_monotonic - time.monotonic()
+        elif self.next_iter is None:  # not started yet
             return 0.0
-
-        raw_until_next = (self.next_iter - datetime.datetime.utcnow()).total_seconds()
+        else:
+            raw_until_next = (self.next_iter - datetime.datetime.utcnow()).total_seconds()
         if raw_until_next > self.expected_interval.total_seconds():  # should never happen
             return self.expected_interval.total_seconds()
         elif raw_until_next > 0.0:
@@ -75,23 +105,128 @@ class VexLoop:
         """Register an iteration as starting."""
         self.iter_count += 1
         self.currently_running = True
-        self.last_iter = datetime.datetime.utcnow()
-        self.next_iter = datetime.datetime.utcnow() + self.expected_interval
+
+        now_monotonic = time.monotonic()
+        if self._next_monotonic is not None:
+            expected: Optional[float] = self._next_monotonic
+        elif self._start_monotonic is not None:
+            expected = self._start_monotonic + self.expected_interval.total_seconds()
+        else:
+            expected = None
+        if expected is not None:
+            self.lags.append(max(now_monotonic - expected, 0.0))
+        self._start_monotonic = now_monotonic
+
+        now = datetime.datetime.utcnow()
+        self.last_iter = now
+        self.next_iter = now + self.expected_interval
         # this isn't accurate, it will be "corrected" when finishing is called
 
     def iter_finish(self) -> None:
         """Register an iteration as finished successfully."""
         self.currently_running = False
+        self._record_duration()
         # now this is accurate. imo its better to have something than nothing
 
     def iter_error(self, error: BaseException) -> None:
         """Register an iteration's exception."""
         self.currently_running = False
+        self._record_duration()
+        self.error_count += 1
         self.last_exc_raw = error
         self.last_exc = "".join(
             traceback.format_exception(type(error), error, error.__traceback__)
         )
 
+    def _record_duration(self) -> None:
+        if self._start_monotonic is None:
+            return
+        duration = time.monotonic() - self._start_monotonic
+        self.durations.append(duration)
+        if duration > self.expected_interval.total_seconds():
+            self.overrun_count += 1
+
+    def timing_stats(self) -> Dict[str, float]:
+        """Get percentiles of the recent iteration durations and start lags, in seconds.
+
+        These cover the last few hundred iterations. Keys are ``duration_p50``, ``duration_p95``,
+        ``duration_p99``, ``duration_max``, the same for ``lag``, and ``overruns`` which is the
+        number of iterations that took longer than the interval since the loop was created.
+        Percentiles are 0.0 until there's data for them.
+        """
+        stats: Dict[str, float] = {}
+        for name, samples in (("duration", self.durations), ("lag", self.lags)):
+            ordered = sorted(samples)
+            stats[f"{name}_p50"] = _percentile(ordered, 50)
+            stats[f"{name}_p95"] = _percentile(ordered, 95)
+            stats[f"{name}_p99"] = _percentile(ordered, 99)
+            stats[f"{name}_max"] = ordered[-1] if ordered else 0.0
+        stats["overruns"] = self.overrun_count
+        return stats
+
+    async def run(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        *,
+        missed: MissedPolicy = "skip",
+        align: bool = False,
+    ) -> None:
+        """Run ``func`` every ``expected_interval`` until cancelled, registering the start, finish
+        and any error of each iteration.
+
+        Iterations are scheduled on a fixed grid of ``time.monotonic()``, rather than sleeping for
+        the interval after each one, so the time each iteration takes and any lateness when
+        waking up don't build up over time. System clock changes don't affect this.
+
+        Exceptions from ``func`` are registered with `iter_error` and the loop carries on. Cancel
+        the task running this to stop it.
+
+        Parameters
+        ----------
+        func : Callable[[], Awaitable[Any]]
+            The body of the loop, for example an ``async def`` with no arguments
+        missed : Literal["skip", "catch_up"], optional
+            What to do if an iteration takes longer than the interval, by default "skip".
+            "skip" waits for the next tick in the future, and "catch_up" runs every missed tick
+            straight away, one after another
+        align : bool, optional
+            Whether to wait for the first tick to be on a multiple of the interval in UTC (for
+            example, on the minute with a 60 second interval), by default False
+        """
+        interval = self.expected_interval.total_seconds()
+        start = time.monotonic()
+        if align:
+            start += -time.time() % interval
+
+        tick = 0
+        while True:
+            deadline = start + tick * interval
+            self._set_next(deadline)
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            self.iter_start()
+            self._set_next(deadline + interval)
+            try:
+                await func()
+            except asyncio.CancelledError:
+                self.currently_running = False
+                raise
+            except Exception as e:
+                self.iter_error(e)
+            else:
+                self.iter_finish()
+
+            tick += 1
+            if missed == "skip":
+                tick = max(tick, math.ceil((time.monotonic() - start) / interval))
+
+    def _set_next(self, next_monotonic: float) -> None:
+        self._next_monotonic = next_monotonic
+        until = datetime.timedelta(seconds=next_monotonic - time.monotonic())
+        self.next_iter = datetime.datetime.utcnow() + until
+
     def get_debug_embed(self) -> discord.Embed:
         """Get an embed with infomation on this loop."""
         table = Table("Key", "Value")
@@ -123,9 +258,46 @@ class VexLoop:
             value=processed_table_str,
             inline=False,
         )
+
+        if self.durations:
+            stats = self.timing_stats()
+            table = Table("Seconds", "p50", "p95", "p99", "max")
+            for name in ("duration", "lag"):
+                table.add_row(
+                    name.capitalize(),
+                    *(f"{stats[f'{name}_{p}']:.3f}" for p in ("p50", "p95", "p99", "max")),
+                )
+            timings = f"{self.overrun_count} overrun(s) of the interval\n"
+            timings += no_colour_rich_markup(table)
+            embed.add_field(name="Timings", value=timings, inline=False)
+
+        from .lagmonitor import current_lag_monitor  # circular otherwise
+
+        monitor = current_lag_monitor()
+        if monitor is not None and monitor.lags:
+            lag = monitor.stats()
+            table = Table("Seconds", "p50", "p95", "p99", "max")
+            table.add_row("Lag", *(f"{lag[p]:.3f}" for p in ("p50", "p95", "p99", "max")))
+            value = f"{int(lag['blocked'])} probe(s) blocked, for the whole bot\n"
+            value += no_colour_rich_markup(table)
+            if monitor.stacks:
+                _, blocked, stack = monitor.stacks[-1]
+                value += f"Last block, captured {blocked:.2f}s in:"
+                keep = 1000 - len(value)
+                value += box(stack[-keep:], lang="py")  # the end of the stack is most relevant
+            embed.add_field(name="Event loop lag", value=value[:1024], inline=False)
+
         exc = self.last_exc
         if len(exc) > 1024:
             exc = list(pagify(exc, page_length=1024))[0] + "\n..."
         embed.add_field(name="Exception", value=box(exc), inline=False)
 
         return embed
+
+
+def _percentile(ordered: Sequence[float], percent: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[max(rank, 1) - 1]
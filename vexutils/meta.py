@@ -2,24 +2,51 @@ from __future__ import annotations
 
 import asyncio
 import json
+import time
 from logging import Logger, getLogger
 from pathlib import Path
-from typing import Literal, NamedTuple
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Literal, NamedTuple
 
-import aiohttp
 from redbot.core import VersionInfo, commands
 from redbot.core import version_info as cur_red_version
-from rich import box as rich_box
-from rich.table import Table  # type:ignore
 
-from .chat import no_colour_rich_markup
 from .consts import DOCS_BASE, GREEN_CIRCLE, RED_CIRCLE
-from .loop import VexLoop
+from .shared import get_shared, utils_data_path
+
+# aiohttp, rich and the loop/chat utils are imported where they're used, so get_vex_logger is
+# cheap to import
+if TYPE_CHECKING:
+    import aiohttp
+    from redbot.core.bot import Red
+
+    from .loop import VexLoop
 
 log = getLogger("red.vex-utils")
 
+VEXCODES_VERS_URL = "https://api.vexcodes.com/v2/vers/{}"
+RED_PYPI_URL = "https://pypi.org/pypi/Red-DiscordBot/json"
+
+VERSION_TTL = 3600.0  # seconds
+VERSION_CACHE_FILE = "version_cache.json"
+
+# shared between all my cogs, so if 10 load at once the 10 lookups are one fetch
+# key: (unix time fetched, json-able value)
+_version_cache: dict[str, tuple[float, Any]] = get_shared("meta_version_cache_v1", dict)
+_version_inflight: dict[str, asyncio.Future] = get_shared("meta_version_inflight_v1", dict)
+_version_state: dict[str, bool] = get_shared("meta_version_state_v1", dict)
 
-cog_ver_lock = asyncio.Lock()
+_session: aiohttp.ClientSession | None = None
+
+COMMIT_FILE = Path(__file__).parent / "commit.json"
+_commit_cache: tuple[float, str] | None = None  # (mtime, commit), so it's only reloaded on update
+
+VERSIONS_TABLE_CACHE_SIZE = 64
+_versions_table_cache: dict[tuple[str, ...], str] = {}
+
+OOD_CHECK_DELAY = 5.0  # seconds to wait for more cogs to register before a batched check
+# cog name: version, waiting for the next batched check. shared, so it's one check for all cogs
+_ood_pending: dict[str, str] = get_shared("meta_ood_pending_v1", dict)
+_ood_state: dict[str, asyncio.Task] = get_shared("meta_ood_state_v1", dict)
 
 
 def get_vex_logger(name: str) -> Logger:
@@ -121,29 +148,15 @@ async def format_info(
         cog_updated, utils_updated, red_updated = "Unknown", "Unknown", "Unknown"
         latest = UnknownVers()
 
-    start = f"{qualified_name} by Vexed.\n<https://github.com/Vexed01/Vex-Cogs>\n\n"
+    from rich import box as rich_box
+    from rich.table import Table  # type:ignore
 
-    main_table = Table(
-        "", "Current", "Latest", "Up to date?", title="Versions", box=rich_box.MINIMAL
-    )
+    from .chat import no_colour_rich_markup
 
-    main_table.add_row(
-        "This Cog",
-        str(current.cog),
-        str(latest.cog),
-        GREEN_CIRCLE if cog_updated else RED_CIRCLE,
-    )
-    main_table.add_row(
-        "Bundled Utils",
-        current.utils,
-        latest.utils,
-        GREEN_CIRCLE if utils_updated else RED_CIRCLE,
-    )
-    main_table.add_row(
-        "Red",
-        str(current.red),
-        str(latest.red),
-        GREEN_CIRCLE if red_updated else RED_CIRCLE,
+    start = f"{qualified_name} by Vexed.\n<https://github.com/Vexed01/Vex-Cogs>\n\n"
+
+    versions_table = _render_versions_table(
+        current, latest, cog_updated, utils_updated, red_updated
     )
 
     update_msg = "\n"
@@ -174,7 +187,7 @@ async def format_info(
                 str_value = value
             extra_table.add_row(key, str_value)
 
-    boxed = no_colour_rich_markup(main_table)
+    boxed = versions_table
     boxed += update_msg
     if loops or extras:
         boxed += no_colour_rich_markup(extra_table)
@@ -185,8 +198,7 @@ async def format_info(
 async def out_of_date_check(cogname: str, currentver: str) -> None:
     """Send a log at warning level if the cog is out of date."""
     try:
-        async with cog_ver_lock:
-            vers = await _get_latest_vers(cogname)
+        vers = await _get_latest_vers(cogname)
         if VersionInfo.from_str(currentver) < vers.cog:
             log.warning(
                 f"Your {cogname} cog, from Vex, is out of date. You can update your cogs with the "
@@ -202,6 +214,83 @@ async def out_of_date_check(cogname: str, currentver: str) -> None:
         return
 
 
+async def out_of_date_check_all(cogs: dict[str, str]) -> dict[str, bool | None]:
+    """Check if many cogs are out of date in one go, logging one summary.
+
+    Any that are out of date are logged together at warning level.
+
+    Parameters
+    ----------
+    cogs : dict[str, str]
+        Cog name: current version
+
+    Returns
+    -------
+    dict[str, bool | None]
+        Cog name: whether it's up to date, or None if that couldn't be checked
+    """
+    names = list(cogs)
+    results = await asyncio.gather(
+        *(_get_latest_vers(name) for name in names), return_exceptions=True
+    )
+
+    up_to_date: dict[str, bool | None] = {}
+    for name, vers in zip(names, results):
+        if isinstance(vers, BaseException):
+            log.debug(f"Something went wrong checking if {name} cog is up to date.", exc_info=vers)
+            up_to_date[name] = None
+            continue
+        try:
+            up_to_date[name] = not VersionInfo.from_str(cogs[name]) < vers.cog
+        except Exception as e:
+            log.debug(f"Unable to parse the version of {name} cog.", exc_info=e)
+            up_to_date[name] = None
+
+    outdated = [name for name, updated in up_to_date.items() if updated is False]
+    if outdated:
+        log.warning(
+            f"These cogs from Vex are out of date: {', '.join(sorted(outdated))}. You can update "
+            "your cogs with the 'cog update' command in Discord."
+        )
+    log.debug(
+        f"Checked {len(cogs)} cog(s) from Vex for updates, {len(outdated)} out of date, "
+        f"{list(up_to_date.values()).count(None)} couldn't be checked."
+    )
+    return up_to_date
+
+
+def schedule_out_of_date_check(bot: Red, cogname: str, currentver: str) -> None:
+    """Queue a cog for a batched out of date check, instead of using `out_of_date_check`.
+
+    All my cogs that call this share one background check, run once the bot is ready and no
+    more cogs have been queued for a few seconds. Cogs loaded later get another batched check.
+    """
+    _ood_pending[cogname] = currentver
+
+    task = _ood_state.get("task")
+    if task is None or task.done():
+        _ood_state["task"] = asyncio.create_task(_run_out_of_date_checks(bot))
+
+
+async def _run_out_of_date_checks(bot: Red) -> None:
+    await bot.wait_until_red_ready()
+
+    # cogs queued while a batch is being checked don't start a new task, as this one isn't done
+    # yet, so keep going until there's nothing left
+    while _ood_pending:
+        count = -1
+        while count != len(_ood_pending):  # wait for any cogs still loading to queue themselves
+            count = len(_ood_pending)
+            await asyncio.sleep(OOD_CHECK_DELAY)
+
+        cogs = dict(_ood_pending)
+        _ood_pending.clear()
+        try:
+            await out_of_date_check_all(cogs)
+        except Exception as e:  # really doesn't matter if this fails so fine with debug level
+            log.debug("Something went wrong checking if cogs are up to date.", exc_info=e)
+
+
 class Vers(NamedTuple):
     cogname: str
     cog: VersionInfo
@@ -216,28 +305,182 @@ class UnknownVers(NamedTuple):
     red: VersionInfo | Literal["Unknown"] = "Unknown"
 
 
+async def close_http_session() -> None:
+    """Close the HTTP session used for version checks, if it's open. Call this on cog unload.
+
+    It will be opened again if it's needed later."""
+    global _session
+    if _session is not None:
+        session, _session = _session, None
+        await session.close()
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Get the HTTP session, creating it on first use so connections are kept alive and pooled."""
+    import aiohttp
+
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=3))
+    return _session
+
+
 async def _get_latest_vers(cogname: str) -> Vers:
-    data: dict
-    async with aiohttp.ClientSession() as session:
-        async with session.get(f"https://api.vexcodes.com/v2/vers/{cogname}", timeout=3) as r:
-            data = await r.json()
-            latest_utils = data["utils"][:7]
-            latest_cog = VersionInfo.from_str(data.get(cogname, "0.0.0"))
-        async with session.get("https://pypi.org/pypi/Red-DiscordBot/json", timeout=3) as r:
-            data = await r.json()
-            latest_red = VersionInfo.from_str(data.get("info", {}).get("version", "0.0.0"))
+    cog, red = await asyncio.gather(
+        _cached_fetch(f"vexcodes:{cogname}", lambda: _fetch_cog_vers(cogname)),
+        _cached_fetch("pypi:Red-DiscordBot", _fetch_red_ver),
+    )
 
-    return Vers(cogname, latest_cog, latest_utils, latest_red)
+    return Vers(cogname, VersionInfo.from_str(cog["cog"]), cog["utils"], VersionInfo.from_str(red))
 
 
-def _get_current_vers(curr_cog_ver: str, qual_name: str) -> Vers:
-    with open(Path(__file__).parent / "commit.json") as fp:
-        data = json.load(fp)
-        latest_utils = data.get("latest_commit", "Unknown")[:7]
+async def _fetch_cog_vers(cogname: str) -> dict[str, str]:
+    async with _get_session().get(VEXCODES_VERS_URL.format(cogname)) as r:
+        data = await r.json()
+    return {"cog": data.get(cogname, "0.0.0"), "utils": data["utils"][:7]}
 
+
+async def _fetch_red_ver() -> str:
+    async with _get_session().get(RED_PYPI_URL) as r:
+        data = await r.json()
+    return data.get("info", {}).get("version", "0.0.0")
+
+
+async def _cached_fetch(key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """Get a value from the version cache, fetching it if needed.
+
+    Concurrent callers for the same key share one fetch. If there's only an expired value (for
+    example from disk, on a cold start) that is returned straight away and refreshed in the
+    background, so only a completely empty cache waits on the network.
+    """
+    if not _version_state.get("loaded_disk"):
+        _version_state["loaded_disk"] = True
+        _load_version_cache()
+
+    entry = _version_cache.get(key)
+    if entry is not None and time.time() - entry[0] < VERSION_TTL:
+        return entry[1]
+
+    future = _version_inflight.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_refresh(key, fetch))
+        future.add_done_callback(_retrieve_exception)  # it's logged, and might not be awaited
+        _version_inflight[key] = future
+
+    if entry is not None:
+        return entry[1]
+    return await asyncio.shield(future)
+
+
+async def _refresh(key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    try:
+        value = await fetch()
+    except Exception as e:
+        log.debug(f"Failed to fetch {key}.", exc_info=e)
+        raise
+    finally:
+        _version_inflight.pop(key, None)
+
+    _version_cache[key] = (time.time(), value)
+    _save_version_cache()
+    return value
+
+
+def _retrieve_exception(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
+
+
+def _load_version_cache() -> None:
+    try:
+        with open(utils_data_path() / VERSION_CACHE_FILE) as fp:
+            data = json.load(fp)
+    except FileNotFoundError:
+        return
+    except Exception as e:  # corrupt file, data path issues... not worth more than debug
+        log.debug("Unable to load the version cache.", exc_info=e)
+        return
+
+    for key, (fetched, value) in data.items():
+        if key not in _version_cache:
+            _version_cache[key] = (fetched, value)
+
+
+def _save_version_cache() -> None:
+    try:
+        path = utils_data_path() / VERSION_CACHE_FILE
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as fp:
+            json.dump(_version_cache, fp)
+        tmp.replace(path)
+    except Exception as e:
+        log.debug("Unable to save the version cache.", exc_info=e)
+
+
+def _get_current_vers(curr_cog_ver: str, qual_name: str) -> Vers:
     return Vers(
         qual_name,
         VersionInfo.from_str(curr_cog_ver),
-        latest_utils,
+        _get_current_utils(),
         cur_red_version,
     )
+
+
+def _get_current_utils() -> str:
+    global _commit_cache
+    mtime = COMMIT_FILE.stat().st_mtime
+    if _commit_cache is None or _commit_cache[0] != mtime:
+        with open(COMMIT_FILE) as fp:
+            data = json.load(fp)
+        _commit_cache = (mtime, data.get("latest_commit", "Unknown")[:7])
+    return _commit_cache[1]
+
+
+def _render_versions_table(
+    current: Vers,
+    latest: Vers | UnknownVers,
+    cog_updated: bool | str,
+    utils_updated: bool | str,
+    red_updated: bool | str,
+) -> str:
+    """Render the versions table, or get it from the cache if it's been rendered before."""
+    from rich import box as rich_box
+    from rich.table import Table  # type:ignore
+
+    from .chat import no_colour_rich_markup
+
+    key = tuple(
+        str(i) for i in (*current[1:], *latest[1:], cog_updated, utils_updated, red_updated)
+    )
+    cached = _versions_table_cache.get(key)
+    if cached is not None:
+        return cached
+
+    main_table = Table(
+        "", "Current", "Latest", "Up to date?", title="Versions", box=rich_box.MINIMAL
+    )
+
+    main_table.add_row(
+        "This Cog",
+        str(current.cog),
+        str(latest.cog),
+        GREEN_CIRCLE if cog_updated else RED_CIRCLE,
+    )
+    main_table.add_row(
+        "Bundled Utils",
+        current.utils,
+        latest.utils,
+        GREEN_CIRCLE if utils_updated else RED_CIRCLE,
+    )
+    main_table.add_row(
+        "Red",
+        str(current.red),
+        str(latest.red),
+        GREEN_CIRCLE if red_updated else RED_CIRCLE,
+    )
+
+    rendered = no_colour_rich_markup(main_table)
+    if len(_versions_table_cache) >= VERSIONS_TABLE_CACHE_SIZE:
+        _versions_table_cache.pop(next(iter(_versions_table_cache)))  # oldest
+    _versions_table_cache[key] = rendered
+    return rendered
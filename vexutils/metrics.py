@@ -0,0 +1,157 @@
+import abc
+import json
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from .loop import loop_registry
+
+# metrics for every VexLoop from every cog, for scraping by Prometheus or anything that takes JSON
+
+# in the range exporters use. Prometheus itself is on 9090
+DEFAULT_PORT = 9731
+
+
+def loop_snapshot() -> List[Dict[str, Any]]:
+    """Get the current state of every VexLoop, from every cog.
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        One dict per loop, sorted by cog then loop name. ``id`` tells apart loops with the same
+        cog and name, such as one left over from before a cog reload
+    """
+    snapshot = []
+    for loop in list(loop_registry):
+        # other cogs might have an older copy of the utils, without some of these
+        stats = loop.timing_stats() if hasattr(loop, "timing_stats") else {}
+        snapshot.append(
+            {
+                "loop": loop.friendly_name,
+                "cog": getattr(loop, "cog_name", None) or "",
+                "id": f"{id(loop):x}",
+                "expected_interval": loop.expected_interval.total_seconds(),
+                "iter_count": loop.iter_count,
+                "error_count": getattr(loop, "error_count", 0),
+                "overrun_count": getattr(loop, "overrun_count", 0),
+                "integrity": loop.integrity,
+                "currently_running": loop.currently_running,
+                "until_next": loop.until_next,
+                **{k: v for k, v in stats.items() if k != "overruns"},
+            }
+        )
+    snapshot.sort(key=lambda x: (x["cog"], x["loop"], x["id"]))
+    return snapshot
+
+
+class MetricsExporter(abc.ABC):
+    """Base class for turning a `loop_snapshot` into text to serve. Subclass this to add
+    another format."""
+
+    content_type = "text/plain"
+
+    @abc.abstractmethod
+    def render(self, snapshot: List[Dict[str, Any]]) -> str:
+        """Turn the snapshot into the response body."""
+
+
+class JSONExporter(MetricsExporter):
+    """Export the snapshot as is, as a JSON list."""
+
+    content_type = "application/json"
+
+    def render(self, snapshot: List[Dict[str, Any]]) -> str:
+        return json.dumps(snapshot)
+
+
+class PrometheusExporter(MetricsExporter):
+    """Export in the Prometheus text format, with each loop labelled by ``cog``, ``loop`` and
+    ``id``. Without ``id``, two loops with the same labels would make Prometheus reject the whole
+    scrape."""
+
+    content_type = "text/plain; version=0.0.4"
+
+    # (snapshot key, metric name, type, help)
+    METRICS = [
+        ("iter_count", "iterations_total", "counter", "Iterations started."),
+        ("error_count", "errors_total", "counter", "Iterations that raised an exception."),
+        ("overrun_count", "overruns_total", "counter", "Iterations longer than the interval."),
+        ("integrity", "integrity", "gauge", "1 if the loop is running on time."),
+        ("currently_running", "running", "gauge", "1 if an iteration is in progress."),
+        ("expected_interval", "interval_seconds", "gauge", "Expected time between iterations."),
+    ]
+    SUMMARIES = [
+        ("duration", "duration_seconds", "Recent iteration durations."),
+        ("lag", "lag_seconds", "Recent lateness of iteration starts."),
+    ]
+
+    def __init__(self, prefix: str = "vex_loop") -> None:
+        self.prefix = prefix
+
+    def render(self, snapshot: List[Dict[str, Any]]) -> str:
+        lines = []
+        for key, name, type_, help_ in self.METRICS:
+            lines.append(f"# HELP {self.prefix}_{name} {help_}")
+            lines.append(f"# TYPE {self.prefix}_{name} {type_}")
+            for loop in snapshot:
+                lines.append(f"{self.prefix}_{name}{{{_labels(loop)}}} {float(loop[key])}")
+
+        for key, name, help_ in self.SUMMARIES:
+            lines.append(f"# HELP {self.prefix}_{name} {help_}")
+            lines.append(f"# TYPE {self.prefix}_{name} summary")
+            for loop in snapshot:
+                for percentile, quantile in (("p50", "0.5"), ("p95", "0.95"), ("p99", "0.99")):
+                    value = loop.get(f"{key}_{percentile}")
+                    if value is not None:
+                        labels = _labels(loop, quantile=quantile)
+                        lines.append(f"{self.prefix}_{name}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    exporter: Optional[MetricsExporter] = None,
+    path: str = "/metrics",
+) -> web.AppRunner:
+    """Serve metrics for every VexLoop over HTTP, for scraping.
+
+    Only one cog should call this, as the loops of every cog are included anyway.
+
+    Parameters
+    ----------
+    host : str, optional
+        The host to listen on, by default "127.0.0.1"
+    port : int, optional
+        The port to listen on, by default 9731
+    exporter : Optional[MetricsExporter], optional
+        The format to serve, by default `PrometheusExporter`
+    path : str, optional
+        The URL path, by default "/metrics"
+
+    Returns
+    -------
+    web.AppRunner
+        The runner, call ``await runner.cleanup()`` to stop the server (eg on cog unload)
+    """
+    chosen = exporter or PrometheusExporter()
+
+    async def handler(request: web.Request) -> web.Response:
+        body = chosen.render(loop_snapshot())
+        return web.Response(text=body, headers={"Content-Type": chosen.content_type})
+
+    app = web.Application()
+    app.router.add_get(path, handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def _labels(loop: Dict[str, Any], **extra: str) -> str:
+    labels = {"cog": loop["cog"], "loop": loop["loop"], "id": loop["id"], **extra}
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,380 @@
+import concurrent.futures
+import functools
+import json
+import os
+import shutil
+from asyncio.events import AbstractEventLoop
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Sequence
+
+from redbot.core.bot import Red
+from redbot.core.data_manager import cog_data_path
+
+# a columnar alternative to PandasSQLiteDriver, with the same async interface
+# each table is a folder of append-only segments, and each segment has one .npy file per column
+# plus the index. SQLite stores each timestamp as ~19 chars of text, this stores them as 8 bytes,
+# and reads can memory map the files instead of parsing every row
+
+try:
+    import numpy
+    import pandas
+except ImportError:
+    raise RuntimeError("Pandas must be installed for this driver to work.")
+
+if TYPE_CHECKING:
+    from .sqldriver import PandasSQLiteDriver
+
+META_FILE = "meta.json"
+INDEX_FILE = "index.npy"
+
+
+class PandasNpyDriver:
+    """An asynchronous, columnar driver for Pandas dataframes, storing NumPy ``.npy`` files.
+
+    Only frames with a datetime index and numeric columns are supported.
+    """
+
+    def __init__(
+        self,
+        bot: Red,
+        cog_name: str,
+        dirname: str,
+        table: str = "main_df",
+        *,
+        compact_segments: int = 32,
+        compact_rows: int = 10000,
+    ) -> None:
+        """Get a driver object for interacting with a table in the given cog's datapath.
+
+        Parameters
+        ----------
+        bot : Red
+            Bot object
+        cog_name : str
+            Full cog name, LikeThis
+        dirname : str
+            The folder name to use for the database, for example `timeseries`
+        table : str, optional
+            The table to use, by default "main_df"
+        compact_segments : int, optional
+            Merge the newest small segments once there are this many of them, by default 32
+        compact_rows : int, optional
+            Segments with fewer rows than this count as small, by default 10000
+        """
+        self.bot = bot
+        self.table = table
+        self.compact_segments = compact_segments
+        self.compact_rows = compact_rows
+
+        self.executor = concurrent.futures.ThreadPoolExecutor(1, f"{cog_name.lower()}_npy")
+        self.path = cog_data_path(raw_name=cog_name) / dirname
+
+    def _table_path(self, table: Optional[str]) -> Path:
+        return self.path / (table or self.table)
+
+    def _write(self, df: pandas.DataFrame, table: Optional[str] = None) -> None:
+        path = self._table_path(table)
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        meta = _new_meta(df)
+        if not df.empty:
+            meta["segments"].append(_write_segment(tmp, 0, df, meta))
+        _write_meta(tmp, meta)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    def _append(self, df: pandas.DataFrame, table: Optional[str] = None) -> None:
+        path = self._table_path(table)
+        meta = _read_meta(path)
+        if meta is None:
+            self._write(df, table)
+            return
+        if df.empty:
+            return
+
+        new = [c for c in df.columns if c not in meta["columns"]]
+        if new:
+            raise ValueError(f"The table has no column(s) {new}, use write to change columns.")
+        bad = [c for c, dtype in df.dtypes.items() if dtype.kind not in "biuf"]
+        if bad:
+            raise TypeError(f"Only numeric columns can be stored, not {bad}.")
+
+        number = meta["next"]
+        meta["segments"].append(_write_segment(path, number, df, meta))
+        _write_meta(path, meta)  # the segment only exists once this is written
+
+        self._compact(path, meta)
+
+    def _compact(self, path: Path, meta: dict, force: bool = False) -> None:
+        """Merge trailing small segments into one, so appends don't leave thousands of files."""
+        small = 0
+        for segment in reversed(meta["segments"]):
+            if segment["rows"] >= self.compact_rows and not force:
+                break
+            small += 1
+        if small < 2 or (small < self.compact_segments and not force):
+            return
+
+        merging = meta["segments"][-small:]
+        df = pandas.concat([_load_segment(path, s, meta, None, copy=False) for s in merging])
+        number = meta["next"]
+        meta["segments"][-small:] = [_write_segment(path, number, df, meta)]
+        _write_meta(path, meta)
+
+        for segment in merging:
+            shutil.rmtree(path / segment["name"], ignore_errors=True)
+
+    def _read_range(
+        self,
+        start: Any,
+        end: Any,
+        columns: Optional[Sequence[str]],
+        table: Optional[str],
+        copy: bool,
+    ) -> pandas.DataFrame:
+        path = self._table_path(table)
+        meta = _read_meta(path)
+        if meta is None:
+            raise FileNotFoundError(f"The table {table or self.table} does not exist.")
+        if columns is not None:
+            missing = [c for c in columns if c not in meta["columns"]]
+            if missing:
+                raise KeyError(f"The table has no column(s) {missing}.")
+
+        start = None if start is None else _to_index_time(start)
+        end = None if end is None else _to_index_time(end)
+
+        frames = []
+        for segment in meta["segments"]:
+            if start is not None and numpy.datetime64(segment["last"]) < start:
+                continue
+            if end is not None and numpy.datetime64(segment["first"]) >= end:
+                continue
+            frames.append(_load_segment(path, segment, meta, columns, copy, start, end))
+
+        if not frames:
+            return _empty_frame(meta, columns)
+        if len(frames) == 1:
+            return frames[0]
+        return pandas.concat(frames)
+
+    async def write(self, df: pandas.DataFrame, table: Optional[str] = None) -> None:
+        """Write a dataframe to the database. Replaces and old data."""
+        assert isinstance(self.bot.loop, AbstractEventLoop)
+        func = functools.partial(self._write, df.copy(True), table)
+        await self.bot.loop.run_in_executor(self.executor, func)
+
+    async def append(self, df: pandas.DataFrame, table: Optional[str] = None) -> None:
+        """Append a dataframe to the database.
+
+        The frame can leave out columns, which will be NaN, but can't add new ones."""
+        assert isinstance(self.bot.loop, AbstractEventLoop)
+        func = functools.partial(self._append, df.copy(True), table)
+        await self.bot.loop.run_in_executor(self.executor, func)
+
+    async def read(self, table: Optional[str] = None, *, copy: bool = True) -> pandas.DataFrame:
+        """Read the database, returning as a pandas dataframe.
+
+        With ``copy=False``, columns from a single segment are read-only views of the memory
+        mapped files, so nothing is loaded until it's used. Don't modify these in place."""
+        return await self.read_range(table=table, copy=copy)
+
+    async def read_range(
+        self,
+        start: Any = None,
+        end: Any = None,
+        *,
+        columns: Optional[Sequence[str]] = None,
+        table: Optional[str] = None,
+        copy: bool = True,
+    ) -> pandas.DataFrame:
+        """Read only the rows with an index in ``[start, end)``, and optionally only some columns.
+
+        Segments outside the range aren't opened, and only the needed part of the rest is read.
+        See `read` for ``copy``. The other arguments match `PandasSQLiteDriver.read_range`.
+        """
+        assert isinstance(self.bot.loop, AbstractEventLoop)
+        func = functools.partial(self._read_range, start, end, columns, table, copy)
+        return await self.bot.loop.run_in_executor(self.executor, func)
+
+    async def compact(self, table: Optional[str] = None) -> None:
+        """Merge all small trailing segments now, rather than waiting for enough of them."""
+        assert isinstance(self.bot.loop, AbstractEventLoop)
+
+        def _compact() -> None:
+            path = self._table_path(table)
+            meta = _read_meta(path)
+            if meta is not None:
+                self._compact(path, meta, force=True)
+
+        await self.bot.loop.run_in_executor(self.executor, _compact)
+
+    async def migrate_from_sqlite(
+        self,
+        driver: "PandasSQLiteDriver",
+        tables: Optional[Sequence[str]] = None,
+        *,
+        chunksize: int = 50000,
+    ) -> None:
+        """Copy tables from a `PandasSQLiteDriver` into this driver, replacing them here.
+
+        This streams the tables in chunks, so doesn't need the whole of a table in memory. The
+        tables are read on a read only connection without a range, so the SQLite database isn't
+        changed. Delete it once the cog has switched over.
+
+        Parameters
+        ----------
+        driver : PandasSQLiteDriver
+            The driver to copy from
+        tables : Optional[Sequence[str]], optional
+            The tables to copy, by default only the SQLite driver's table. The tables keep their
+            names
+        chunksize : int, optional
+            Rows to copy at a time, by default 50000
+        """
+        for table in tables or [driver.table]:
+            first = True
+            columns: list = []
+            async for chunk in driver.iter_chunks(chunksize, table=table):
+                if chunk.empty:
+                    # an empty table still gives one chunk, where pandas leaves the index as a
+                    # column
+                    columns = [c for c in chunk.columns if c != "index"]
+                    continue
+                chunk = _coerce_numeric(chunk)
+                if first:
+                    await self.write(chunk, table)
+                    first = False
+                else:
+                    await self.append(chunk, table)
+            if first:  # no rows, so keep the columns as float, the same as all NULL columns
+                empty = pandas.DataFrame(
+                    {c: numpy.array([], dtype="float64") for c in columns},
+                    index=pandas.DatetimeIndex([]),
+                )
+                await self.write(empty, table)
+            await self.compact(table)
+
+    async def close(self) -> None:
+        """Shut down the executor, after anything already queued. Call this on cog unload."""
+        assert isinstance(self.bot.loop, AbstractEventLoop)
+        await self.bot.loop.run_in_executor(self.executor, lambda: None)
+        self.executor.shutdown(wait=False)
+
+    def storage_usage(self) -> int:
+        """Return the size of all tables in bytes."""
+        return sum(f.stat().st_size for f in self.path.rglob("*") if f.is_file())
+
+
+def _new_meta(df: pandas.DataFrame) -> dict:
+    if not isinstance(df.index, pandas.DatetimeIndex):
+        raise TypeError("The index must be a DatetimeIndex.")
+    bad = [c for c, dtype in df.dtypes.items() if dtype.kind not in "biuf"]
+    if bad:
+        raise TypeError(f"Only numeric columns can be stored, not {bad}.")
+    return {
+        "columns": [str(c) for c in df.columns],
+        "dtypes": [dtype.str for dtype in df.dtypes],
+        "tz": None if df.index.tz is None else str(df.index.tz),
+        "segments": [],
+        "next": 0,
+    }
+
+
+def _coerce_numeric(df: pandas.DataFrame) -> pandas.DataFrame:
+    """Make columns that read_sql gave as object numeric. This happens when a chunk of a column
+    is all NULL, for example if it was added after the first rows were written."""
+    objects = [c for c, dtype in df.dtypes.items() if dtype.kind not in "biuf"]
+    if not objects:
+        return df
+    df = df.copy()
+    for column in objects:
+        try:
+            df[column] = pandas.to_numeric(df[column]).astype("float64")
+        except (ValueError, TypeError):
+            pass  # really not numeric, so left for the check when it's written
+    return df
+
+
+def _read_meta(path: Path) -> Optional[dict]:
+    try:
+        with open(path / META_FILE) as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return None
+
+
+def _write_meta(path: Path, meta: dict) -> None:
+    tmp = path / (META_FILE + ".tmp")
+    with open(tmp, "w") as fp:
+        json.dump(meta, fp)
+    os.replace(tmp, path / META_FILE)
+
+
+def _write_segment(path: Path, number: int, df: pandas.DataFrame, meta: dict) -> dict:
+    """Write a new segment, returning its entry for the meta. The meta's ``next`` is bumped."""
+    df = df.reindex(columns=meta["columns"]).sort_index()
+    index = df.index
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+
+    name = f"{number:08d}"
+    folder = path / name
+    folder.mkdir()
+    numpy.save(folder / INDEX_FILE, index.values)
+    for i, (column, dtype) in enumerate(zip(meta["columns"], meta["dtypes"])):
+        values = df[column].to_numpy()
+        if values.dtype != numpy.dtype(dtype):  # eg ints that became floats from missing values
+            values = values.astype(numpy.result_type(values.dtype, dtype))
+        numpy.save(folder / f"{i}.npy", values)
+
+    meta["next"] = number + 1
+    return {
+        "name": name,
+        "rows": len(df),
+        "first": index[0].isoformat(),
+        "last": index[-1].isoformat(),
+    }
+
+
+def _load_segment(
+    path: Path,
+    segment: dict,
+    meta: dict,
+    columns: Optional[Sequence[str]],
+    copy: bool,
+    start: Optional[numpy.datetime64] = None,
+    end: Optional[numpy.datetime64] = None,
+) -> pandas.DataFrame:
+    folder = path / segment["name"]
+    index = numpy.load(folder / INDEX_FILE, mmap_mode="r")
+    lo = 0 if start is None else int(numpy.searchsorted(index, start))
+    hi = len(index) if end is None else int(numpy.searchsorted(index, end))
+
+    data = {}
+    for column in meta["columns"] if columns is None else columns:
+        values = numpy.load(folder / f"{meta['columns'].index(column)}.npy", mmap_mode="r")
+        data[column] = values[lo:hi]
+
+    dt_index = pandas.DatetimeIndex(index[lo:hi])
+    if meta["tz"] is not None:
+        dt_index = dt_index.tz_localize("UTC").tz_convert(meta["tz"])
+    return pandas.DataFrame(data, index=dt_index, copy=copy)
+
+
+def _empty_frame(meta: dict, columns: Optional[Sequence[str]]) -> pandas.DataFrame:
+    names = meta["columns"] if columns is None else list(columns)
+    dtypes = dict(zip(meta["columns"], meta["dtypes"]))
+    index = pandas.DatetimeIndex([], tz=meta["tz"])
+    return pandas.DataFrame({c: numpy.array([], dtype=dtypes[c]) for c in names}, index=index)
+
+
+def _to_index_time(time: Any) -> numpy.datetime64:
+    """Convert a time to naive UTC, matching how the index is stored."""
+    ts = pandas.Timestamp(time)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.to_datetime64()
@@ -0,0 +1,280 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Tuple, Union
+
+import discord
+from discord.http import Route
+from redbot.core.bot import Red
+
+from .url_buttons import URLButton, _build_payload, _to_json
+
+# queues messages per channel and sends them with a cap on how many requests are in flight, for
+# sending the same alert to hundreds of channels. discord.py already waits on the rate limit
+# bucket headers, so this sends each channel's messages in order one at a time (they share a
+# bucket, so sending them at once just piles up on its lock) and only sends different channels
+# concurrently. 429s that make it through discord.py are retried after Retry-After
+
+log = logging.getLogger("red.vex-utils")
+
+THROUGHPUT_WINDOW = 60.0  # seconds
+
+Request = Callable[..., Awaitable[Any]]
+
+
+class MessageSender:
+    """Send messages (optionally with a URL button) through per channel queues, with a limit on
+    concurrent requests.
+
+    Example
+    -------
+    ```py
+    sender = MessageSender(bot)
+    results = await sender.broadcast(channel_ids, embed=embed)
+    failed = [c for c, r in results.items() if isinstance(r, Exception)]
+    ...
+    await sender.close()  # on cog unload
+    ```
+    """
+
+    def __init__(
+        self,
+        bot: Red,
+        *,
+        max_concurrency: int = 5,
+        max_queued: int = 1000,
+        max_retries: int = 3,
+        request: Optional[Request] = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        bot : Red
+            Bot object
+        max_concurrency : int, optional
+            Requests that can be in flight at once, across all channels, by default 5
+        max_queued : int, optional
+            Messages that can be waiting to send before `send` and `broadcast` wait for space,
+            by default 1000
+        max_retries : int, optional
+            Times to retry a message after being rate limited, by default 3
+        request : Optional[Request], optional
+            Used instead of discord.py's ``HTTPClient.request``, with the same arguments. This is
+            for testing against a fake HTTP handler
+        """
+        self.bot = bot
+        self.max_retries = max_retries
+        self._request = request
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._slots = asyncio.Semaphore(max_queued)
+        self._queues: Dict[int, Deque[Tuple[str, asyncio.Future]]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._paused_until = 0.0  # monotonic, set by a global rate limit
+        self._closed = False
+
+        self._started = time.monotonic()
+        self._sent_times: Deque[float] = deque()
+        self.sent_count = 0
+        self.failed_count = 0
+        self.rate_limited_count = 0
+        self.in_flight = 0
+
+    async def send(
+        self,
+        channel_id: int,
+        *,
+        content: Optional[str] = None,
+        embed: Optional[discord.Embed] = None,
+        url_button: Optional[URLButton] = None,
+    ) -> dict:
+        """Queue a message and wait for it to be sent.
+
+        Returns
+        -------
+        dict
+            The message data from Discord
+
+        Raises
+        ------
+        discord.HTTPException
+            Sending failed, or was still rate limited after all retries
+        RuntimeError
+            The sender has been closed
+        """
+        payload_json = _to_json(_build_payload(content, embed, url_button))
+        return await self._enqueue(channel_id, payload_json)
+
+    async def broadcast(
+        self,
+        channel_ids: Iterable[int],
+        *,
+        content: Optional[str] = None,
+        embed: Optional[discord.Embed] = None,
+        url_button: Optional[URLButton] = None,
+    ) -> Dict[int, Union[dict, BaseException]]:
+        """Send the same message to many channels, and wait for them all.
+
+        The payload is only built and serialised once. A failure in one channel doesn't stop
+        the others.
+
+        Returns
+        -------
+        Dict[int, Union[dict, BaseException]]
+            Channel ID: the message data, or the exception if sending failed
+        """
+        payload_json = _to_json(_build_payload(content, embed, url_button))
+        channel_ids = list(dict.fromkeys(channel_ids))
+        results = await asyncio.gather(
+            *(self._enqueue(channel_id, payload_json) for channel_id in channel_ids),
+            return_exceptions=True,
+        )
+        return dict(zip(channel_ids, results))
+
+    async def _enqueue(self, channel_id: int, payload_json: str) -> dict:
+        if self._closed:
+            raise RuntimeError("The sender has been closed.")
+        await self._slots.acquire()
+        try:
+            if self._closed:
+                raise RuntimeError("The sender has been closed.")
+            future = asyncio.get_running_loop().create_future()
+            self._queues.setdefault(channel_id, deque()).append((payload_json, future))
+            if channel_id not in self._workers:
+                self._workers[channel_id] = asyncio.create_task(self._worker(channel_id))
+            return await future
+        finally:
+            self._slots.release()
+
+    async def _worker(self, channel_id: int) -> None:
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                payload_json, future = queue.popleft()
+                if future.done():  # the caller was cancelled
+                    continue
+                try:
+                    result = await self._send_one(channel_id, payload_json)
+                except asyncio.CancelledError:
+                    if not future.done():
+                        future.set_exception(RuntimeError("The sender was closed."))
+                    raise
+                except Exception as e:
+                    self.failed_count += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self._record_sent()
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._workers.pop(channel_id, None)
+            if not queue:
+                self._queues.pop(channel_id, None)
+
+    async def _send_one(self, channel_id: int, payload_json: str) -> dict:
+        request = self._request or self.bot._connection.http.request
+        route = Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
+        # as form data, so the already serialised JSON can be sent as is
+        form = [{"name": "payload_json", "value": payload_json}]
+
+        for attempt in itertools.count():
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            async with self._semaphore:
+                self.in_flight += 1
+                try:
+                    return await request(route, form=form)
+                except (discord.RateLimited, discord.HTTPException) as e:
+                    retry_after = _retry_after(e)
+                    if retry_after is None or attempt >= self.max_retries:
+                        raise
+                    is_global = _is_global(e)
+                finally:
+                    self.in_flight -= 1
+
+            self.rate_limited_count += 1
+            if is_global:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            log.debug(
+                "Rate limited sending to channel %s, retrying in %.2fs", channel_id, retry_after
+            )
+            await asyncio.sleep(retry_after)
+
+        raise AssertionError("unreachable")  # for type checkers
+
+    def _record_sent(self) -> None:
+        self.sent_count += 1
+        now = time.monotonic()
+        self._sent_times.append(now)
+        self._trim_sent_times(now)
+
+    def _trim_sent_times(self, now: float) -> None:
+        while self._sent_times and self._sent_times[0] < now - THROUGHPUT_WINDOW:
+            self._sent_times.popleft()
+
+    def stats(self) -> Dict[str, float]:
+        """Get stats on the sender.
+
+        ``per_second`` is the throughput over the last minute. ``queued`` is messages waiting,
+        not including those ``in_flight``, and ``max_channel_queued`` is the longest queue of a
+        single channel.
+        """
+        now = time.monotonic()
+        self._trim_sent_times(now)
+        elapsed = min(THROUGHPUT_WINDOW, now - self._started)
+        depths = [len(queue) for queue in self._queues.values()]
+        return {
+            "sent": self.sent_count,
+            "failed": self.failed_count,
+            "rate_limited": self.rate_limited_count,
+            "in_flight": self.in_flight,
+            "queued": sum(depths),
+            "channels": len(depths),
+            "max_channel_queued": max(depths, default=0),
+            "per_second": len(self._sent_times) / elapsed if elapsed > 0 else 0.0,
+        }
+
+    async def close(self, *, drain: bool = True) -> None:
+        """Stop accepting messages. Call this on cog unload.
+
+        Parameters
+        ----------
+        drain : bool, optional
+            Whether to send messages already queued first, by default True. Otherwise they fail
+            with RuntimeError
+        """
+        self._closed = True
+        workers = list(self._workers.values())
+        if not drain:
+            for task in workers:
+                task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        for queue in self._queues.values():
+            for _, future in queue:
+                if not future.done():
+                    future.set_exception(RuntimeError("The sender was closed."))
+        self._queues.clear()
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait before retrying, or None if this isn't a rate limit."""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    if isinstance(error, discord.HTTPException) and error.status == 429:
+        headers = getattr(error.response, "headers", None) or {}
+        try:
+            return float(headers.get("Retry-After", 1.0))
+        except ValueError:
+            return 1.0
+    return None
+
+
+def _is_global(error: Exception) -> bool:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    return headers.get("X-RateLimit-Global", "").lower() == "true"
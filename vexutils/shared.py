@@ -0,0 +1,41 @@
+import sys
+import types
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from redbot.core.data_manager import cog_data_path
+
+# every cog bundles its own copy of these utils, so module level variables are per cog. anything
+# that should be shared between all of my cogs goes in a namespace in sys.modules instead, which
+# is the same for the whole process. only store builtin/stdlib types in it, as different cogs can
+# have different versions of the utils, and put a version in the key if the layout changes
+
+_NAMESPACE = "vexutils_shared"
+
+T = TypeVar("T")
+
+
+def get_shared(key: str, factory: Callable[[], T]) -> T:
+    """Get an object shared between every cog's copy of the utils, creating it if needed.
+
+    Parameters
+    ----------
+    key : str
+        Unique name of the object, for example ``meta_cache_v1``
+    factory : Callable[[], T]
+        Called with no arguments to create the object, if it doesn't exist yet
+
+    Returns
+    -------
+    T
+        The shared object
+    """
+    namespace = sys.modules.setdefault(_NAMESPACE, types.ModuleType(_NAMESPACE))
+    if not hasattr(namespace, key):
+        setattr(namespace, key, factory())
+    return getattr(namespace, key)
+
+
+def utils_data_path() -> Path:
+    """Get the data path for files shared between all of my cogs."""
+    return cog_data_path(raw_name="VexCogUtils")
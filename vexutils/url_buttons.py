@@ -1,9 +1,35 @@
-from typing import Optional
+import asyncio
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs, urlparse
 
 import discord
 from discord.http import Route
 from redbot.core.bot import Red
 
+from .shared import get_shared
+
+# files are streamed by aiohttp rather than read into memory first: discord.File already streams
+# from a path, and StreamedFile streams from an async iterator.
+# my cogs often post the same generated graph to lots of channels, so the CDN URL of each uploaded
+# attachment is cached by a hash of its content. when an embed uses an attachment that's already
+# been uploaded, the embed points at the old URL instead. Discord's CDN URLs are signed and
+# expire (the ex= parameter), so they're only reused until a bit before then
+
+ATTACHMENT_CACHE_SIZE = 256
+ATTACHMENT_TTL = 12 * 60 * 60  # seconds, for URLs without an expiry
+EXPIRY_MARGIN = 60 * 60  # stop using a URL this many seconds before it expires
+HASH_CHUNK_SIZE = 2**16
+
+# content hash: (URL, unix time to stop using it). shared, so one cog can reuse another's upload
+_attachment_cache: "OrderedDict[str, Tuple[str, float]]" = get_shared(
+    "attachment_cache_v1", OrderedDict
+)
+
 
 class URLButton:
     def __init__(self, label: str, url: str) -> None:
@@ -24,6 +50,42 @@ class URLButton:
         }
 
 
+class StreamedFile:
+    """A file to upload from an async iterator of bytes, for example a download or a file read
+    with aiofiles, without holding it all in memory.
+
+    The iterator can only be read once. discord.py retries a request after some server errors
+    and rate limits, and unlike with `discord.File` the retry can't send the file again, so
+    RuntimeError is raised instead.
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes], filename: str) -> None:
+        if not isinstance(filename, str):
+            raise TypeError("Filename must be a string")
+
+        self.chunks = chunks
+        self.filename = filename
+        self.hash: Optional[str] = None  # set once it's been uploaded
+        self._used = False
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        # aiohttp calls this for each attempt at the request, and the chunks that a failed
+        # attempt read are gone, so a retry would upload an empty or cut off file
+        if self._used:
+            raise RuntimeError(f"StreamedFile {self.filename} can only be uploaded once.")
+        self._used = True
+        return self._read()
+
+    async def _read(self) -> AsyncIterator[bytes]:
+        # hashes the file as it's uploaded, so it can be added to the cache afterwards. it's only
+        # set if the whole file was read, which can only be in the first and only attempt
+        hasher = hashlib.sha256()
+        async for chunk in self.chunks:
+            hasher.update(chunk)
+            yield chunk
+        self.hash = hasher.hexdigest()
+
+
 async def send_message(
     bot: Red,
     channel_id: int,
@@ -31,34 +93,175 @@ async def send_message(
     content: Optional[str] = None,
     embed: Optional[discord.Embed] = None,
     file: Optional[discord.File] = None,
+    files: Optional[Sequence[Union[discord.File, StreamedFile]]] = None,
+    url_button: Optional[URLButton] = None,
+    reuse_attachments: bool = True,
+) -> dict:
+    """Send a message with a URL button, with pure dpy 1.7.
+
+    Files are streamed, so a `discord.File` made from a path or a `StreamedFile` isn't read into
+    memory. If the embed's image or thumbnail is an ``attachment://`` URL for a file that has
+    already been uploaded with the same content, the old upload is used instead of uploading it
+    again (unless ``reuse_attachments`` is False). `discord.File` objects aren't closed, and are
+    rewound so the same one can be sent again.
+
+    Returns
+    -------
+    dict
+        The message data from Discord
+    """
+    payload = _build_payload(content, embed, url_button)
+    uploads: List[Union[discord.File, StreamedFile]] = [*([file] if file else []), *(files or [])]
+    r = Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
+
+    # only files the embed uses can be reused, so others aren't read to hash them
+    used = set(_embed_attachments(payload["embed"]).values()) if "embed" in payload else set()
+    hashes: List[Optional[str]] = []
+    if uploads and reuse_attachments and used:
+        loop = asyncio.get_running_loop()
+        for upload in uploads:
+            if isinstance(upload, discord.File) and upload.filename in used:
+                hashes.append(await loop.run_in_executor(None, _hash_file, upload))
+            else:
+                hashes.append(None)  # StreamedFile's is only known once it's been read
+        uploads, hashes = _reuse_attachments(payload["embed"], uploads, hashes)
+    else:
+        hashes = [None] * len(uploads)
+
+    if not uploads:
+        return await bot._connection.http.request(r, json=payload)
+
+    payload["attachments"] = [{"id": i, "filename": f.filename} for i, f in enumerate(uploads)]
+    form = [{"name": "payload_json", "value": _to_json(payload)}]
+    for i, upload in enumerate(uploads):
+        form.append(
+            {
+                "name": f"files[{i}]",
+                "value": upload.fp if isinstance(upload, discord.File) else upload,
+                "filename": upload.filename,
+                "content_type": "application/octet-stream",
+            }
+        )
+
+    dpy_files = [f for f in uploads if isinstance(f, discord.File)]
+    try:
+        data = await bot._connection.http.request(r, form=form, files=dpy_files)
+    except TypeError as e:
+        # aiohttp wraps StreamedFile's error when it's read again for a retry
+        if isinstance(e.__cause__, RuntimeError):
+            raise e.__cause__ from None
+        raise
+    finally:
+        for f in dpy_files:
+            f.reset()
+
+    if reuse_attachments and isinstance(data, dict):
+        hashes = [h if h else getattr(f, "hash", None) for f, h in zip(uploads, hashes)]
+        _cache_attachments(data.get("attachments", []), uploads, hashes)
+    return data
+
+
+def _hash_file(file: discord.File) -> str:
+    hasher = hashlib.sha256()
+    file.reset()
+    for chunk in iter(lambda: file.fp.read(HASH_CHUNK_SIZE), b""):
+        hasher.update(chunk)
+    file.reset()
+    return hasher.hexdigest()
+
+
+def _get_cached_url(content_hash: str) -> Optional[str]:
+    cached = _attachment_cache.get(content_hash)
+    if cached is None:
+        return None
+    url, use_until = cached
+    if time.time() >= use_until:
+        del _attachment_cache[content_hash]
+        return None
+    _attachment_cache.move_to_end(content_hash)
+    return url
+
+
+def _reuse_attachments(
+    embed: dict, uploads: List[Union[discord.File, StreamedFile]], hashes: List[Optional[str]]
+) -> Tuple[List[Union[discord.File, StreamedFile]], List[Optional[str]]]:
+    """Point the embed at already uploaded copies of its attachments, returning the uploads
+    and their hashes that are still needed."""
+    reused = set()
+    for key, filename in _embed_attachments(embed).items():
+        for i, upload in enumerate(uploads):
+            if upload.filename != filename or hashes[i] is None:
+                continue
+            cached = _get_cached_url(hashes[i])  # type:ignore
+            if cached is not None:
+                embed[key]["url"] = cached
+                reused.add(i)
+            break
+
+    keep = [i for i in range(len(uploads)) if i not in reused]
+    return [uploads[i] for i in keep], [hashes[i] for i in keep]
+
+
+def _embed_attachments(embed: dict) -> Dict[str, str]:
+    """Embed key: filename, for the image and thumbnail if they're ``attachment://`` URLs."""
+    attachments = {}
+    for key in ("image", "thumbnail"):
+        url = embed.get(key, {}).get("url", "")
+        if url.startswith("attachment://"):
+            attachments[key] = url.split("://", 1)[1]
+    return attachments
+
+
+def _cache_attachments(
+    attachments: List[dict],
+    uploads: Sequence[Union[discord.File, StreamedFile]],
+    hashes: Sequence[Optional[str]],
+) -> None:
+    if len(attachments) != len(uploads):  # can't tell which is which
+        return
+    now = time.time()
+    for attachment, content_hash in zip(attachments, hashes):
+        url = attachment.get("url")
+        if not url or content_hash is None:
+            continue
+        _attachment_cache[content_hash] = (url, _url_use_until(url, now))
+        _attachment_cache.move_to_end(content_hash)
+    while len(_attachment_cache) > ATTACHMENT_CACHE_SIZE:
+        _attachment_cache.popitem(last=False)
+
+
+def _url_use_until(url: str, now: float) -> float:
+    use_until = now + ATTACHMENT_TTL
+    expires = parse_qs(urlparse(url).query).get("ex")
+    if expires:
+        try:
+            use_until = min(use_until, int(expires[0], 16) - EXPIRY_MARGIN)
+        except ValueError:
+            pass
+    return use_until
+
+
+def _build_payload(
+    content: Optional[str] = None,
+    embed: Optional[discord.Embed] = None,
     url_button: Optional[URLButton] = None,
-):
-    """Send a message with a URL button, with pure dpy 1.7."""
+) -> dict:
     payload = {}
 
     if content:
         payload["content"] = content
 
     if embed:
-        payload["embed"] = embed.to_dict()
+        # to_dict shares the embed's own dicts, and the image and thumbnail URLs can be changed
+        # to reuse an attachment, which mustn't change the embed for the next send
+        payload["embed"] = copy.deepcopy(embed.to_dict())
 
     if url_button:
         payload["components"] = [{"type": 1, "components": [url_button.to_dict()]}]  # type:ignore
 
-    if file:
-        form = [
-            {
-                "name": "file",
-                "value": file.fp,
-                "filename": file.filename,
-                "content_type": "application/octet-stream",
-            },
-            {"name": "payload_json", "value": discord.utils.to_json(payload)},
-        ]
+    return payload
 
-        r = Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
-        await bot._connection.http.request(r, form=form, files=[file])
 
-    else:
-        r = Route("POST", "/channels/{channel_id}/messages", channel_id=channel_id)
-        await bot._connection.http.request(r, json=payload)
+def _to_json(payload: dict) -> str:
+    # same as discord.py, which only has this as a private function in 2.X
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=True)